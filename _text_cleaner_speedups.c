@@ -0,0 +1,381 @@
+/*
+ * Optional compiled versions of the hot loops of text_cleaner.py.
+ *
+ * text_cleaner.py imports this module when it has been built (see
+ * setup.py) and falls back to its pure python versions otherwise. Both must
+ * give exactly the same results:
+ *
+ * stem(word) -- the table driven porter stemmer of text_cleaner.stem.
+ * filterWords(tokens, words, wanted) -- text_cleaner._filterWords, the
+ *     token filter of removeStopwords and removeNonDictionaryWords.
+ */
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+#include <string.h>
+
+/* strings are always ready from python 3.12 on, which deprecates
+   PyUnicode_READY and PyUnicode_IS_READY */
+#if PY_VERSION_HEX >= 0x030C0000
+#define readyString(s) 0
+#define isReadyString(s) 1
+#else
+#define readyString(s) PyUnicode_READY(s)
+#define isReadyString(s) PyUnicode_IS_READY(s)
+#endif
+
+typedef struct {
+	const char *suffix;
+	const char *replacement;
+} Rule;
+
+/* see PorterStemmer.step2, in the order the rules are tried */
+static const Rule step2Rules[] = {
+	{"ational", "ate"}, {"tional", "tion"}, {"enci", "ence"},
+	{"anci", "ance"}, {"izer", "ize"},
+	{"bli", "ble"}, /* --DEPARTURE-- */
+	{"alli", "al"}, {"entli", "ent"}, {"eli", "e"}, {"ousli", "ous"},
+	{"ization", "ize"}, {"ation", "ate"}, {"ator", "ate"}, {"alism", "al"},
+	{"iveness", "ive"}, {"fulness", "ful"}, {"ousness", "ous"},
+	{"aliti", "al"}, {"iviti", "ive"}, {"biliti", "ble"},
+	{"logi", "log"}, /* --DEPARTURE-- */
+	{NULL, NULL}};
+
+/* see PorterStemmer.step3 */
+static const Rule step3Rules[] = {
+	{"icate", "ic"}, {"ative", ""}, {"alize", "al"}, {"iciti", "ic"},
+	{"ical", "ic"}, {"ful", ""}, {"ness", ""},
+	{NULL, NULL}};
+
+/* see PorterStemmer.step4, the replacement is always '' */
+static const Rule step4Rules[] = {
+	{"al", ""}, {"ance", ""}, {"ence", ""}, {"er", ""}, {"ic", ""},
+	{"able", ""}, {"ible", ""}, {"ant", ""}, {"ement", ""}, {"ment", ""},
+	{"ent", ""}, {"ion", ""}, {"ou", ""}, {"ism", ""}, {"ate", ""},
+	{"iti", ""}, {"ous", ""}, {"ive", ""}, {"ize", ""},
+	{NULL, NULL}};
+
+static int
+isVowel(Py_UCS4 ch)
+{
+	return ch == 'a' || ch == 'e' || ch == 'i' || ch == 'o' || ch == 'u';
+}
+
+/* True <=> b[0..k) ends with suffix. */
+static int
+ends(const Py_UCS4 *b, Py_ssize_t k, const char *suffix)
+{
+	Py_ssize_t length = (Py_ssize_t)strlen(suffix);
+	Py_ssize_t i;
+	if (length > k)
+		return 0;
+	for (i = 0; i < length; i++) {
+		if (b[k - length + i] != (Py_UCS4)(unsigned char)suffix[i])
+			return 0;
+	}
+	return 1;
+}
+
+/* Number of 'vc' pairs in p[0..end), which is m() of b[0..end). */
+static int
+measure(const char *p, Py_ssize_t end)
+{
+	int n = 0;
+	Py_ssize_t i;
+	for (i = 0; i + 1 < end; i++) {
+		if (p[i] == 'v' && p[i + 1] == 'c')
+			n++;
+	}
+	return n;
+}
+
+/* True <=> p[0..end) holds a vowel. */
+static int
+hasVowel(const char *p, Py_ssize_t end)
+{
+	Py_ssize_t i;
+	for (i = 0; i < end; i++) {
+		if (p[i] == 'v')
+			return 1;
+	}
+	return 0;
+}
+
+/* True <=> i-2,i-1,i is consonant - vowel - consonant, and the second
+   consonant is not w, x or y. */
+static int
+cvc(const Py_UCS4 *b, const char *p, Py_ssize_t i)
+{
+	return i >= 2 && p[i - 2] == 'c' && p[i - 1] == 'v' && p[i] == 'c' &&
+		b[i] != 'w' && b[i] != 'x' && b[i] != 'y';
+}
+
+/* Set b[at..) to the replacement, keeping the pattern, and return the new
+   length. A replacement holds no y, so its pattern only follows vowels. */
+static Py_ssize_t
+setTo(Py_UCS4 *b, char *p, Py_ssize_t at, const char *replacement)
+{
+	for (; *replacement; replacement++, at++) {
+		b[at] = (Py_UCS4)(unsigned char)*replacement;
+		p[at] = isVowel(b[at]) ? 'v' : 'c';
+	}
+	return at;
+}
+
+/* Stem b[0..k) with pattern p, returning the length of the stem. */
+static Py_ssize_t
+stemBuffer(Py_UCS4 *b, char *p, Py_ssize_t k)
+{
+	Py_ssize_t suffix = 0;
+	const Rule *rule;
+	const Rule *steps[2] = {step2Rules, step3Rules};
+	int step, m;
+
+	/* step1ab: get rid of plurals and -ed or -ing */
+	if (b[k - 1] == 's') {
+		if (ends(b, k, "sses") || ends(b, k, "ies"))
+			k -= 2;
+		else if (b[k - 2] != 's')
+			k -= 1;
+	}
+	if (k >= 2 && b[k - 1] == 'd' && b[k - 2] == 'e') {
+		if (ends(b, k, "eed")) {
+			if (measure(p, k - 3) > 0)
+				k -= 1;
+		}
+		else
+			suffix = 2;
+	}
+	else if (ends(b, k, "ing"))
+		suffix = 3;
+	if (suffix && hasVowel(p, k - suffix)) {
+		k -= suffix;
+		if (ends(b, k, "at") || ends(b, k, "bl") || ends(b, k, "iz"))
+			k = setTo(b, p, k, "e");
+		else if (k >= 2 && b[k - 1] == b[k - 2] && p[k - 1] == 'c') {
+			if (b[k - 1] != 'l' && b[k - 1] != 's' && b[k - 1] != 'z')
+				k -= 1;
+		}
+		else if (measure(p, k) == 1 && cvc(b, p, k - 1))
+			k = setTo(b, p, k, "e");
+	}
+
+	/* step1c: turn terminal y to i when there is another vowel in the
+	   stem */
+	if (b[k - 1] == 'y' && hasVowel(p, k - 1))
+		setTo(b, p, k - 1, "i");
+
+	/* step2 and step3 replace the first suffix of their rules that b ends
+	   with, if the rest of b has m() > 0 */
+	for (step = 0; step < 2; step++) {
+		for (rule = steps[step]; rule->suffix != NULL; rule++) {
+			if (ends(b, k, rule->suffix)) {
+				Py_ssize_t j = k - (Py_ssize_t)strlen(rule->suffix);
+				if (measure(p, j) > 0)
+					k = setTo(b, p, j, rule->replacement);
+				break;
+			}
+		}
+	}
+
+	/* step4: take off -ant, -ence etc., in context <c>vcvc<v> */
+	for (rule = step4Rules; rule->suffix != NULL; rule++) {
+		if (ends(b, k, rule->suffix)) {
+			Py_ssize_t j = k - (Py_ssize_t)strlen(rule->suffix);
+			if ((strcmp(rule->suffix, "ion") != 0 ||
+					(j > 0 && (b[j - 1] == 's' || b[j - 1] == 't'))) &&
+					measure(p, j) > 1)
+				k = j;
+			break;
+		}
+	}
+
+	/* step5: remove a final -e if m() > 1, and change -ll to -l if
+	   m() > 1 */
+	m = measure(p, k);
+	if (b[k - 1] == 'e' && (m > 1 || (m == 1 && !cvc(b, p, k - 2))))
+		k -= 1;
+	if (m > 1 && k >= 2 && b[k - 1] == 'l' && b[k - 2] == 'l')
+		k -= 1;
+	return k;
+}
+
+PyDoc_STRVAR(stem_doc,
+"stem(word)\n\
+\n\
+Return the porter stem of a lower case word, see text_cleaner.stem.");
+
+static PyObject *
+stem(PyObject *module, PyObject *word)
+{
+	Py_UCS4 bStack[64];
+	char pStack[64];
+	Py_UCS4 *b = bStack;
+	char *p = pStack;
+	Py_ssize_t n, i, k;
+	int kind;
+	const void *data;
+	PyObject *result;
+
+	if (!PyUnicode_Check(word)) {
+		PyErr_Format(PyExc_TypeError, "stem() argument must be str, not %.100s",
+					Py_TYPE(word)->tp_name);
+		return NULL;
+	}
+	if (readyString(word) < 0)
+		return NULL;
+	n = PyUnicode_GET_LENGTH(word);
+	if (n <= 2) {
+		Py_INCREF(word);
+		return word;
+	}
+	if (n > 64) {
+		b = PyMem_Malloc(n * sizeof(Py_UCS4));
+		p = PyMem_Malloc(n);
+		if (b == NULL || p == NULL) {
+			PyMem_Free(b);
+			PyMem_Free(p);
+			return PyErr_NoMemory();
+		}
+	}
+	/* the consonant/vowel pattern, y is a consonant at the start and after
+	   a vowel */
+	kind = PyUnicode_KIND(word);
+	data = PyUnicode_DATA(word);
+	for (i = 0; i < n; i++) {
+		b[i] = PyUnicode_READ(kind, data, i);
+		if (isVowel(b[i]))
+			p[i] = 'v';
+		else if (b[i] == 'y')
+			p[i] = (i == 0 || p[i - 1] == 'v') ? 'c' : 'v';
+		else
+			p[i] = 'c';
+	}
+	k = stemBuffer(b, p, n);
+	result = PyUnicode_FromKindAndData(PyUnicode_4BYTE_KIND, b, k);
+	if (b != bStack) {
+		PyMem_Free(b);
+		PyMem_Free(p);
+	}
+	return result;
+}
+
+/* Return the lower case form of an ASCII str, or a new reference to it if
+   it has no upper case letters. */
+static PyObject *
+asciiLower(PyObject *word)
+{
+	const Py_UCS1 *data = PyUnicode_1BYTE_DATA(word);
+	Py_ssize_t n = PyUnicode_GET_LENGTH(word);
+	Py_ssize_t i;
+	PyObject *lower;
+	Py_UCS1 *out;
+
+	for (i = 0; i < n; i++) {
+		if (data[i] >= 'A' && data[i] <= 'Z')
+			break;
+	}
+	if (i == n) {
+		Py_INCREF(word);
+		return word;
+	}
+	lower = PyUnicode_New(n, 127);
+	if (lower == NULL)
+		return NULL;
+	out = PyUnicode_1BYTE_DATA(lower);
+	memcpy(out, data, i);
+	for (; i < n; i++)
+		out[i] = (data[i] >= 'A' && data[i] <= 'Z') ? data[i] + 32 : data[i];
+	return lower;
+}
+
+/* True <=> an ASCII str has no white space at either end, so strip() would
+   return it as it is. */
+static int
+asciiStripped(PyObject *word)
+{
+	const Py_UCS1 *data = PyUnicode_1BYTE_DATA(word);
+	Py_ssize_t n = PyUnicode_GET_LENGTH(word);
+	return n == 0 || (!Py_UNICODE_ISSPACE(data[0]) &&
+					!Py_UNICODE_ISSPACE(data[n - 1]));
+}
+
+PyDoc_STRVAR(filterWords_doc,
+"filterWords(tokens, words, wanted)\n\
+\n\
+Return the stripped tokens whose lower case form being in words equals\n\
+wanted, see text_cleaner._filterWords.");
+
+static PyObject *
+filterWords(PyObject *module, PyObject *args)
+{
+	PyObject *tokens, *words, *sequence, *kept;
+	int wanted;
+	Py_ssize_t n, i;
+
+	if (!PyArg_ParseTuple(args, "OOp:filterWords", &tokens, &words, &wanted))
+		return NULL;
+	sequence = PySequence_Fast(tokens, "filterWords() tokens must be iterable");
+	if (sequence == NULL)
+		return NULL;
+	kept = PyList_New(0);
+	if (kept == NULL) {
+		Py_DECREF(sequence);
+		return NULL;
+	}
+	n = PySequence_Fast_GET_SIZE(sequence);
+	for (i = 0; i < n; i++) {
+		PyObject *token = PySequence_Fast_GET_ITEM(sequence, i);
+		PyObject *word, *lower;
+		int found;
+
+		if (PyUnicode_CheckExact(token) && isReadyString(token) &&
+				PyUnicode_IS_ASCII(token) && asciiStripped(token)) {
+			Py_INCREF(token);
+			word = token;
+		}
+		else
+			word = PyObject_CallMethod(token, "strip", NULL);
+		if (word == NULL)
+			goto error;
+		if (PyUnicode_CheckExact(word) && PyUnicode_IS_ASCII(word))
+			lower = asciiLower(word);
+		else
+			lower = PyObject_CallMethod(word, "lower", NULL);
+		if (lower == NULL) {
+			Py_DECREF(word);
+			goto error;
+		}
+		found = PySequence_Contains(words, lower);
+		Py_DECREF(lower);
+		if (found < 0 || (found == wanted && PyList_Append(kept, word) < 0)) {
+			Py_DECREF(word);
+			goto error;
+		}
+		Py_DECREF(word);
+	}
+	Py_DECREF(sequence);
+	return kept;
+
+error:
+	Py_DECREF(sequence);
+	Py_DECREF(kept);
+	return NULL;
+}
+
+static PyMethodDef speedupsMethods[] = {
+	{"stem", stem, METH_O, stem_doc},
+	{"filterWords", filterWords, METH_VARARGS, filterWords_doc},
+	{NULL, NULL, 0, NULL}};
+
+static struct PyModuleDef speedupsModule = {
+	PyModuleDef_HEAD_INIT,
+	"_text_cleaner_speedups",
+	"Compiled versions of the hot loops of text_cleaner.py.",
+	-1,
+	speedupsMethods};
+
+PyMODINIT_FUNC
+PyInit__text_cleaner_speedups(void)
+{
+	return PyModule_Create(&speedupsModule);
+}
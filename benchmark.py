@@ -0,0 +1,359 @@
+#!/usr/bin/python2
+#-*- coding: utf-8 -*-
+"""Benchmark the text_cleaner Remover, PorterStemmer and command line.
+
+Every Remover method and PorterStemmer.stemWords is timed line by line over
+each corpus, and the command line tool is timed with a set of flag
+combinations in line and word mode. When the compiled speedups are built
+they are timed and checked against their python versions. Results are
+written as JSON, and can be compared against a stored baseline run.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import platform
+import argparse
+import tempfile
+import subprocess
+from timeit import default_timer
+
+try:
+	import tracemalloc
+except ImportError:
+	tracemalloc = None # python 2, peak memory is only measured for the CLI
+
+import text_cleaner
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SAMPLES = [os.path.join(HERE, 'wiki_tesla.txt'),
+			os.path.join(HERE, 'wiki_tesla.html')]
+
+METHODS = ['removeStopwords', 'removePunctuation', 'removeNonDictionaryWords',
+			'removeNumbers', 'removeExtraSpaces', 'removeArticlesFromFront',
+			'removeTags', 'removeApostrophes', 'removeHtml']
+
+CLI_FLAGS = ['-n', '-a', '-t', '-p', '-S', '-w', '-e', '-s', '-ntpe',
+			'-ntpSes', '-Antpaes', '-lntpSwes', '-HntpSes']
+
+SIZES = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
+
+
+def parseSize(size):
+	"""Turn a size such as 1M, 100M or 1G into a number of bytes."""
+	size = size.strip().upper()
+	if size[-1:] in SIZES:
+		return int(float(size[:-1]) * SIZES[size[-1]])
+	return int(size)
+
+def syntheticCorpus(size, workDir):
+	"""Return the path of a corpus of about size bytes made from the samples.
+
+	Lines of the bundled samples are picked in a fixed random order, so the
+	same size always gives the same file. Existing files are reused.
+	"""
+	path = os.path.join(workDir, 'synthetic-%d.txt' % size)
+	if os.path.exists(path) and os.path.getsize(path) >= size:
+		return path
+	lines = []
+	for sample in SAMPLES:
+		lines.extend(open(sample, 'r').readlines())
+	rand = random.Random(size)
+	out = open(path, 'w')
+	written = 0
+	while written < size:
+		line = rand.choice(lines)
+		out.write(line)
+		written += len(line)
+	out.close()
+	return path
+
+def dictionaryFile(workDir):
+	"""Write the vocabulary of the samples, used as dictionary words."""
+	path = os.path.join(workDir, 'dictionary.txt')
+	words = set()
+	for sample in SAMPLES:
+		words.update(w.lower() for w in open(sample, 'r').read().split())
+	out = open(path, 'w')
+	out.write("\n".join(sorted(words)) + "\n")
+	out.close()
+	return path
+
+def countTokens(path):
+	"""Return the number of bytes and whitespace separated tokens in path."""
+	tokens = 0
+	for line in open(path, 'r'):
+		tokens += len(line.split())
+	return os.path.getsize(path), tokens
+
+def timeFunction(function, path, repeat):
+	"""Return the best time of running function on each line of path."""
+	best = None
+	for i in range(repeat):
+		lines = open(path, 'r')
+		start = default_timer()
+		for line in lines:
+			function(line.strip())
+		elapsed = default_timer() - start
+		lines.close()
+		if best is None or elapsed < best:
+			best = elapsed
+	return best
+
+def peakMemory(function, path):
+	"""Return the peak memory (KiB) allocated running function on path."""
+	if tracemalloc is None:
+		return None
+	tracemalloc.start()
+	for line in open(path, 'r'):
+		function(line.strip())
+	peak = tracemalloc.get_traced_memory()[1]
+	tracemalloc.stop()
+	return peak // 1024
+
+def runCli(flags, path, dictionary, repeat):
+	"""Return the best time and the peak RSS (KiB) of a CLI run."""
+	command = [sys.executable, os.path.join(HERE, 'text_cleaner.py')]
+	command.extend(flags.split())
+	if 'w' in flags:
+		command.extend(['--dict-file', dictionary])
+	command.extend(['-i', path])
+	best = None
+	peak = 0
+	devnull = open(os.devnull, 'w')
+	for i in range(repeat):
+		start = default_timer()
+		process = subprocess.Popen(command, stdout=devnull)
+		pid, status, usage = os.wait4(process.pid, 0)
+		elapsed = default_timer() - start
+		if status != 0:
+			raise RuntimeError("'%s' failed" % " ".join(command))
+		if best is None or elapsed < best:
+			best = elapsed
+		# ru_maxrss is in KiB on Linux (bytes on Mac OS)
+		peak = max(peak, usage.ru_maxrss)
+	devnull.close()
+	return best, peak
+
+def checkSpeedups(path, cleaner, repeat):
+	"""Time the compiled speedups against their python versions on the
+	words of path, returning (name, seconds, python seconds) tuples and the
+	words they do not agree on."""
+	tokens = []
+	for line in open(path, 'r'):
+		tokens.extend(line.strip().split(' '))
+	words = [w.lower() for w in tokens]
+	speedups = text_cleaner._speedups
+	pairs = [('stem', lambda: [speedups.stem(w) for w in words],
+				lambda: [text_cleaner._pythonStem(w) for w in words]),
+			('filterWords', lambda: speedups.filterWords(tokens,
+					cleaner._stopwords, False),
+				lambda: text_cleaner._pythonFilterWords(tokens,
+					cleaner._stopwords, False))]
+	timings = []
+	mismatches = []
+	for name, compiled, python in pairs:
+		if compiled() != python():
+			mismatches.append(name)
+		timings.append((name, bestTime(compiled, repeat),
+						bestTime(python, repeat)))
+	mismatches.extend(w for w in set(words)
+					if speedups.stem(w) != text_cleaner._pythonStem(w))
+	return timings, mismatches
+
+def bestTime(function, repeat):
+	"""Return the best time of calling function repeat times."""
+	best = None
+	for i in range(repeat):
+		start = default_timer()
+		function()
+		elapsed = default_timer() - start
+		if best is None or elapsed < best:
+			best = elapsed
+	return best
+
+def result(kind, name, corpus, size, tokens, seconds, memory):
+	"""Build one result record."""
+	return {'kind': kind,
+			'name': name,
+			'corpus': corpus,
+			'bytes': size,
+			'tokens': tokens,
+			'seconds': round(seconds, 6),
+			'mb_per_s': round(size / seconds / (1 << 20), 3) if seconds else None,
+			'tokens_per_s': round(tokens / seconds, 1) if seconds else None,
+			'peak_memory_kb': memory}
+
+def benchmark(corpora, parts, cliFlags, repeat, measureMemory, workDir):
+	"""Run the selected benchmark parts over corpora, returning results."""
+	dictionary = dictionaryFile(workDir)
+	cleaner = text_cleaner.Remover(dictionaryfile=dictionary)
+	results = []
+	mismatches = []
+	for path in corpora:
+		corpus = os.path.basename(path)
+		size, tokens = countTokens(path)
+		functions = []
+		if 'methods' in parts:
+			functions.extend(('method', m, getattr(cleaner, m)) for m in METHODS)
+		if 'stemmer' in parts:
+			functions.append(('stemmer', 'stemWords',
+							text_cleaner.PorterStemmer().stemWords))
+			functions.append(('stemmer', 'stemWords (no cache)',
+							text_cleaner.PorterStemmer(False).stemWords))
+		for kind, name, function in functions:
+			seconds = timeFunction(function, path, repeat)
+			memory = peakMemory(function, path) if measureMemory else None
+			results.append(result(kind, name, corpus, size, tokens, seconds,
+							memory))
+			report(results[-1])
+		if 'speedups' in parts and text_cleaner._speedups is not None:
+			timings, wrong = checkSpeedups(path, cleaner, repeat)
+			mismatches.extend(wrong)
+			for name, seconds, pythonSeconds in timings:
+				for variant, elapsed in (('compiled', seconds),
+										('python', pythonSeconds)):
+					results.append(result('speedups',
+									'%s (%s)' % (name, variant), corpus,
+									size, tokens, elapsed, None))
+					report(results[-1])
+		if 'cli' in parts:
+			for flags in cliFlags:
+				for mode in ('', ' -L'):
+					seconds, memory = runCli(flags + mode, path, dictionary,
+											repeat)
+					results.append(result('cli', flags + mode, corpus, size,
+									tokens, seconds, memory))
+					report(results[-1])
+	for mismatch in sorted(set(mismatches)):
+		sys.stderr.write("compiled and python differ: %s\n" % mismatch)
+	return results, mismatches
+
+def report(record):
+	"""Write a one line summary of a result to stderr."""
+	sys.stderr.write("%-8s %-28s %-24s %10.4fs %9.2f MB/s\n" % (
+					record['kind'], record['name'], record['corpus'],
+					record['seconds'], record['mb_per_s'] or 0))
+
+def compare(results, baseline, maxSlowdown):
+	"""Compare results with a baseline run, returning the regressions.
+
+	Each result gets a 'baseline_ratio' (seconds / baseline seconds) when
+	the baseline has the same benchmark.
+	"""
+	previous = dict(((r['kind'], r['name'], r['corpus']), r)
+					for r in baseline['results'])
+	regressions = []
+	for record in results:
+		old = previous.get((record['kind'], record['name'], record['corpus']))
+		if old is None or not old['seconds']:
+			continue
+		record['baseline_ratio'] = round(record['seconds'] / old['seconds'], 3)
+		if record['baseline_ratio'] > maxSlowdown:
+			regressions.append(record)
+			sys.stderr.write("slower: %s %s on %s (%.2fx)\n" % (record['kind'],
+							record['name'], record['corpus'],
+							record['baseline_ratio']))
+	return regressions
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(
+				prog='./benchmark.py',
+				description="""Benchmark text_cleaner.py and write the
+							results as JSON.""")
+	parser.add_argument('--sizes',
+				dest='sizes',
+				default='1M',
+				help="""comma separated sizes of synthetic corpora to build
+						from the samples, e.g. 1M,100M,1G. Default is 1M, an
+						empty value uses only the samples.""",
+				metavar="SIZES")
+	parser.add_argument('--no-samples',
+				dest='samples',
+				action='store_false',
+				default=True,
+				help="""do not benchmark the bundled wiki_tesla samples.""")
+	parser.add_argument('--parts',
+				dest='parts',
+				default='methods,stemmer,speedups,cli',
+				help="""comma separated parts to run out of methods, stemmer,
+						speedups and cli. Default is all of them. speedups
+						times the compiled speedups (when built) against their
+						python versions, and exits with status 1 when they
+						do not agree.""",
+				metavar="PARTS")
+	parser.add_argument('--cli-flags',
+				dest='cli_flags',
+				default=",".join(CLI_FLAGS),
+				help="""comma separated flag combinations to run the command
+						line tool with. Each runs in word and line mode.""",
+				metavar="FLAGS")
+	parser.add_argument('-r',
+				'--repeat',
+				dest='repeat',
+				type=int,
+				default=1,
+				help="""run each benchmark N times and keep the best time.""",
+				metavar="N")
+	parser.add_argument('--no-memory',
+				dest='memory',
+				action='store_false',
+				default=True,
+				help="""skip the (slow) peak memory pass of the in process
+						benchmarks.""")
+	parser.add_argument('--work-dir',
+				dest='work_dir',
+				default=tempfile.gettempdir(),
+				help="""directory to keep the synthetic corpora in.""",
+				metavar="DIR")
+	parser.add_argument('-o',
+				'--output',
+				dest='output',
+				default='',
+				help="""write the JSON results to FILE instead of stdout.""",
+				metavar="FILE")
+	parser.add_argument('-b',
+				'--baseline',
+				dest='baseline',
+				default='',
+				help="""compare with the JSON results of an earlier run.""",
+				metavar="FILE")
+	parser.add_argument('--max-slowdown',
+				dest='max_slowdown',
+				type=float,
+				default=1.1,
+				help="""with --baseline, exit with status 1 when a benchmark
+						takes more than RATIO times its baseline time.
+						Default is 1.1.""",
+				metavar="RATIO")
+
+	args = parser.parse_args()
+
+	corpora = SAMPLES[:] if args.samples else []
+	for size in args.sizes.split(','):
+		if size.strip() != '':
+			corpora.append(syntheticCorpus(parseSize(size), args.work_dir))
+
+	results, mismatches = benchmark(corpora, args.parts.split(','),
+					[f.strip() for f in args.cli_flags.split(',') if f.strip()],
+					args.repeat, args.memory, args.work_dir)
+
+	regressions = []
+	if args.baseline != '':
+		regressions = compare(results, json.load(open(args.baseline, 'r')),
+							args.max_slowdown)
+
+	output = {'python': platform.python_version(),
+			'platform': platform.platform(),
+			'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+			'results': results}
+	out = open(args.output, 'w') if args.output != '' else sys.stdout
+	json.dump(output, out, indent=1, sort_keys=True)
+	out.write("\n")
+	if out is not sys.stdout:
+		out.close()
+
+	sys.exit(1 if regressions or mismatches else 0)
@@ -0,0 +1,16 @@
+#!/usr/bin/python
+"""Build the optional compiled speedups of text_cleaner.py.
+
+	python setup.py build_ext --inplace
+
+puts _text_cleaner_speedups next to text_cleaner.py, which then uses it.
+text_cleaner.py works the same without it, only slower.
+"""
+
+from setuptools import setup, Extension
+
+setup(name='text_cleaner',
+		py_modules=['text_cleaner'],
+		ext_modules=[Extension('_text_cleaner_speedups',
+							['_text_cleaner_speedups.c'],
+							optional=True)])
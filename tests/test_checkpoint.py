@@ -0,0 +1,60 @@
+#!/usr/bin/python2
+#-*- coding: utf-8 -*-
+"""Check that --checkpoint keeps writing checkpoints when the input has a
+'<' that is never closed.
+"""
+
+import argparse
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import text_cleaner
+
+
+class CheckpointTest(unittest.TestCase):
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.saved = []
+		self.saveCheckpoint = text_cleaner._saveCheckpoint
+		def saveCheckpoint(filename, checkpoint, out):
+			self.saved.append(checkpoint['input'])
+			self.saveCheckpoint(filename, checkpoint, out)
+		text_cleaner._saveCheckpoint = saveCheckpoint
+
+	def tearDown(self):
+		text_cleaner._saveCheckpoint = self.saveCheckpoint
+		shutil.rmtree(self.directory)
+
+	def testStrayTag(self):
+		inputPath = os.path.join(self.directory, 'in.txt')
+		f = open(inputPath, 'w')
+		f.write("a stray < here\n")
+		for i in range(20000):
+			f.write("plain words %d\n" % i)
+		f.close()
+		outputArgs = argparse.Namespace(lowercase=False, line_mode=False,
+										output_delimiter='space')
+		text_cleaner.cleanCheckpointed(inputPath,
+				os.path.join(self.directory, 'out.txt'),
+				os.path.join(self.directory, 'checkpoint'), ['tags'],
+				outputArgs, every=4096)
+		size = os.path.getsize(inputPath)
+		self.assertEqual(self.saved[-1], size)
+		# a block is cut once the '<' has gone on for maxTagSize characters
+		self.assertTrue(self.saved[0] < 2 * text_cleaner.HtmlStripper.maxTagSize)
+		self.assertTrue(len(self.saved) > 50)
+		f = open(os.path.join(self.directory, 'out.txt'), 'r')
+		words = f.read().split()
+		f.close()
+		self.assertEqual(len(words), 4 + 3 * 20000)
+
+
+if __name__ == '__main__':
+	unittest.main()
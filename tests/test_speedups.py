@@ -0,0 +1,96 @@
+#!/usr/bin/python2
+#-*- coding: utf-8 -*-
+"""Check the compiled speedups against the pure python fallbacks.
+
+Skipped when _text_cleaner_speedups is not built (python setup.py
+build_ext --inplace).
+"""
+
+import io
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import text_cleaner
+
+speedups = text_cleaner._speedups
+SAMPLE = os.path.join(os.path.dirname(HERE), 'wiki_tesla.txt')
+
+
+def sampleLines():
+	f = io.open(SAMPLE, 'r', encoding='utf-8')
+	try:
+		return [line.strip() for line in f]
+	finally:
+		f.close()
+
+
+@unittest.skipIf(speedups is None, "the speedups are not built")
+class SpeedupsTest(unittest.TestCase):
+
+	def setUp(self):
+		self.lines = sampleLines()
+		# split on single spaces, so empty and unstripped tokens are in
+		self.tokens = [t for line in self.lines for t in line.split(' ')]
+		self.tokens.extend([u' Tab\t', u' Nbsp', u'ÉCOLE', u'', u'x y'])
+
+	def testStem(self):
+		f = open(os.path.join(HERE, 'words.txt'), 'r')
+		words = [w.strip() for w in f] + [w.lower() for w in self.tokens]
+		f.close()
+		words.extend([u'cafés', u'naïvely', u'y' * 100, u'\U0001f600s'])
+		self.assertEqual([w for w in words
+						if speedups.stem(w) != text_cleaner._pythonStem(w)], [])
+
+	def assertFilters(self, words):
+		for wanted in (False, True):
+			self.assertEqual(
+				speedups.filterWords(self.tokens, words, wanted),
+				text_cleaner._pythonFilterWords(self.tokens, words, wanted))
+
+	def testFilterStopwords(self):
+		self.assertFilters(text_cleaner.Remover()._stopwords)
+
+	def testFilterDictionary(self):
+		words = set(w.lower() for w in self.tokens[::3])
+		self.assertFilters(words)
+		self.assertFilters(frozenset(words))
+
+	def testFilterWordList(self):
+		directory = tempfile.mkdtemp()
+		try:
+			path = os.path.join(directory, 'words.twl')
+			words = set(w.strip().lower() for w in self.tokens[::3])
+			text_cleaner.WordList.build(words, path)
+			self.assertFilters(text_cleaner.WordList(path))
+		finally:
+			shutil.rmtree(directory)
+
+	def testPipeline(self):
+		for operations in (['stopwords', 'stem'], ['stopwords', 'words', 'stem'],
+						['punctuation', 'stopwords', 'spaces', 'stem']):
+			compiled = self.clean(operations)
+			saved = text_cleaner.stem, text_cleaner._filterWords
+			text_cleaner.stem = text_cleaner._pythonStem
+			text_cleaner._filterWords = text_cleaner._pythonFilterWords
+			try:
+				python = self.clean(operations)
+			finally:
+				text_cleaner.stem, text_cleaner._filterWords = saved
+			self.assertEqual(compiled, python)
+
+	def clean(self, operations):
+		remover = text_cleaner.Remover()
+		remover._dictionary = set(w.lower() for w in self.tokens[::2])
+		stemmer = text_cleaner.PorterStemmer(False)
+		pipeline = text_cleaner.CleaningPipeline(operations, remover, stemmer)
+		return pipeline.cleanBatch(self.lines)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,78 @@
+#!/usr/bin/python2
+#-*- coding: utf-8 -*-
+"""Check the table driven stem() against the original PorterStemmer steps.
+
+words.txt holds the words of the wiki_tesla samples, and a fifth of them
+with each of the suffixes the steps take off or replace.
+"""
+
+import os
+import sys
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import text_cleaner
+
+
+def referenceStem(word):
+	"""Stem word with the step methods of PorterStemmer, the way its stem
+	method did before it was handed to stem()."""
+	stemmer = text_cleaner.PorterStemmer(False)
+	stemmer.b = word
+	stemmer.k = len(word) - 1
+	stemmer.k0 = 0
+	if stemmer.k <= stemmer.k0 + 1:
+		return word
+	stemmer.step1ab()
+	stemmer.step1c()
+	stemmer.step2()
+	stemmer.step3()
+	stemmer.step4()
+	stemmer.step5()
+	return stemmer.b[stemmer.k0:stemmer.k + 1]
+
+def loadWords():
+	f = open(os.path.join(HERE, 'words.txt'), 'r')
+	try:
+		return [line.strip() for line in f if line.strip() != '']
+	finally:
+		f.close()
+
+
+class StemTest(unittest.TestCase):
+
+	def setUp(self):
+		self.words = loadWords()
+
+	def assertStems(self, function):
+		mismatches = [(w, function(w), referenceStem(w)) for w in self.words
+						if function(w) != referenceStem(w)]
+		self.assertEqual(mismatches[:10], [])
+
+	def testWordList(self):
+		self.assertTrue(len(self.words) > 50000)
+
+	def testReference(self):
+		# examples of the Porter paper
+		for word, stem in [('caresses', 'caress'), ('ponies', 'poni'),
+							('agreed', 'agre'), ('hopping', 'hop'),
+							('relational', 'relat'), ('generalization',
+							'gener'), ('controlling', 'control')]:
+			self.assertEqual(referenceStem(word), stem)
+
+	def testPythonStem(self):
+		self.assertStems(text_cleaner._pythonStem)
+
+	def testStem(self):
+		# the compiled stem, when it is built
+		self.assertStems(text_cleaner.stem)
+
+	def testStemWord(self):
+		stemmer = text_cleaner.PorterStemmer()
+		self.assertStems(stemmer.stemWord)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,76 @@
+#!/usr/bin/python2
+#-*- coding: utf-8 -*-
+"""Check that tags spanning chunks are removed, and that a stray '<' only
+holds back a bounded amount of text.
+"""
+
+import os
+import sys
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import text_cleaner
+
+removeTags = text_cleaner.Remover().removeTags
+
+
+class StreamTagsTest(unittest.TestCase):
+
+	def testSpanningTag(self):
+		chunks = ['one <a ', 'href="x"', '> two <b', '>three</b> ']
+		self.assertEqual(''.join(text_cleaner.streamTags(removeTags, chunks)),
+						removeTags(''.join(chunks)))
+
+	def testStrayTag(self):
+		maxTagSize = text_cleaner.HtmlStripper.maxTagSize
+		body = ['word ' * 200] * 2000
+		read = []
+		def chunks():
+			yield 'a stray < here '
+			for chunk in body:
+				read.append(chunk)
+				yield chunk
+		pieces = text_cleaner.streamTags(removeTags, chunks())
+		first = next(pieces)
+		# the '<' is let go after maxTagSize characters, not at the end
+		self.assertTrue(len(read) < len(body) / 10)
+		self.assertTrue(len(first) < maxTagSize + 2000)
+		rest = list(pieces)
+		self.assertTrue(max(len(p) for p in rest) < maxTagSize + 2000)
+		self.assertEqual(first + ''.join(rest),
+						'a stray < here ' + ''.join(body))
+
+	def testTagAfterStrayTag(self):
+		chunks = ['a < b ', 'c ' * 10, 'd <e', 'f> g']
+		self.assertEqual(
+			''.join(text_cleaner.streamTags(removeTags, chunks, 8)),
+			'a < b ' + 'c ' * 10 + 'd  g')
+
+	def testWordMode(self):
+		lines = (['a stray < here'] + ['plain words'] * 10000 +
+				['word <b>bold</b> words'] * 10000)
+		pipeline = text_cleaner.CleaningPipeline(['tags'])
+		words = [w for chunk in pipeline.cleanWords(lines) for w in chunk]
+		self.assertEqual(words, ['a', 'stray', '<', 'here'] +
+						['plain', 'words'] * 10000 +
+						['word', 'bold', 'words'] * 10000)
+
+	def testParallelChunks(self):
+		maxTagSize = text_cleaner.HtmlStripper.maxTagSize
+		lines = ['a <b'] + ['x' * 99] * 10 + ['c> d'] + ['y' * 99] * 3000
+		chunks = [c for c, more in
+				text_cleaner._parallelChunks(lines, 500, True)]
+		# no chunk ends inside the tag
+		self.assertEqual(chunks[0], lines[:12])
+		# but one left open is cut after about maxTagSize characters
+		lines = ['a stray < here'] + ['y' * 99] * 3000
+		chunks = [c for c, more in
+				text_cleaner._parallelChunks(lines, 500, True)]
+		self.assertTrue(len(chunks) > 200)
+		self.assertTrue(len(chunks[0]) * 100 < maxTagSize + 600)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -2,13 +2,52 @@
 #-*- coding: utf-8 -*-
 """Provide text cleaning helper functionality."""
 
+import io
+import codecs
+import os
 import sys
 import string
 import re
 import json
+import stat
+import shlex
+import signal
+import math
+import zlib
+import mmap
+import struct
+import hashlib
+import marshal
 import operator
 import argparse
-from collections import defaultdict
+import binascii
+import array
+import threading
+import multiprocessing
+from collections import defaultdict, OrderedDict, deque
+from timeit import default_timer
+try:
+	from html.entities import name2codepoint
+except ImportError: # python 2
+	from htmlentitydefs import name2codepoint
+try:
+	import queue
+except ImportError: # python 2
+	import Queue as queue
+try:
+	unichr
+except NameError: # python 3
+	unichr = chr
+try:
+	# optional compiled hot loops, built by setup.py
+	import _text_cleaner_speedups as _speedups
+except ImportError:
+	_speedups = None
+try:
+	# optional, for .zst input and output
+	import zstandard as _zstandard
+except ImportError:
+	_zstandard = None
 
 
 class Remover:
@@ -19,7 +58,8 @@ class Remover:
 		punctuation, or dictionary words (valid words) to be used by the
 		rest of the methods.
 	* removeStopwords -- uses the Remover._stopwords list to remove any matching
-		words in the given string.
+		words in the given string, and Remover._phrases to remove stopword
+		phrases (several words).
 	* removeStopwordsLine -- does the same as removeStopwords, but performs the
 		operation on a list of 'lines' (strings) and returns a list of 
 		stopword removed 'lines' (string).
@@ -39,24 +79,58 @@ class Remover:
 	* removeExtraSpacesLine -- same as above, but on a list of strings.
 	* removeArticlesFromFront -- remove articles, defined in Remover._articles,
 		from the front of a string.
+	* removeArticlesFromFrontLine -- same as above but performed on a list of
+		strings.
 	* removeTags -- remove tags from a string.
 	* removeTagsLine -- same as above but performed on a list of strings.
 	* removeApostrophes -- remove apostrophes and replace with nothing.
 	* removeApostrophesLine -- same as above but performed on list of strings.
+	* removeHtml -- strip html markup from a string, dropping script and
+		style content and decoding entities (see HtmlStripper).
+	* removeHtmlLine -- same as above but performed on a list of strings.
+		Markup may span lines.
+	* saveProfile -- save the word lists and regex patterns to a binary
+		profile file. The Tokenizer is not saved, it is given again.
+	* loadProfile -- (class method) load a Remover saved by saveProfile,
+		unless the files it was made from have changed.
+	* removeStopwordsIter, removePunctuationIter, removeNonDictionaryWordsIter,
+		removeNumbersIter, removeExtraSpacesIter, removeArticlesFromFrontIter,
+		removeTagsIter, removeApostrophesIter, removeHtmlIter -- lazy 
+		versions of the *Line
+		methods. They take any iterable of strings and yield the results, so
+		they can be chained without building intermediate lists.
+
+	Attributes:
+	tokenizer - the Tokenizer splitting strings into words for the
+		stopword and dictionary removals (and CleaningPipeline).
 
 	Changable parameters:
 	_stopwords - list of stopwords (lowercase)
+	_phrases - token trie of stopword phrases (see _phraseTrie)
 	_dictionary - list of dictionary words (lowercase)
+
+	The stopword and dictionary files may also be word list files (see
+	WordList), which are memory mapped instead of loaded into a set.
 	_punctuation - list of punctuation
 	_articles - list of articles that should be removed (lowercase)
 	_apostrophe - list of characters that represent an apostrophe
 
 	Callable methods:
 	_doPerLine -- perform removal operation on multiple lines.
+	_iterPerLine -- lazily perform removal operation on an iterable of lines.
+	_doBatch -- perform a line independent removal operation on a list of
+		lines in one call.
+	_sourceStamps -- identify the files a Remover was made from.
 	_compileRegex -- compile or recompile regex used in some removal processes.
+	_removalPattern -- regex source for the text an operation removes.
+	_byteFunction -- the same removal operation on UTF-8 bytes, if it can be.
 	"""
 
+	__punctuationTable = None
+	__punctuationWideRegex = None
+
 	_stopwords = set()
+	_phrases = {}
 	_dictionary = set()
 	_punctuation = []
 	_articles = []
@@ -70,7 +144,9 @@ class Remover:
 						punctuationfile='', 
 						dictionaryfile='',
 						apostrophefile='',
-						articlefile=''):
+						articlefile='',
+						phrasefile='',
+						tokenizer='whitespace'):
 		"""Get a new Remover instance.
 		
 		Params:
@@ -82,7 +158,13 @@ class Remover:
 		[apostrophefile] - path to file defining characters that should be used
 				as apostrophe.
 		[articlefile] - path to file defining words to be used as articles.
+		[phrasefile] - path to file defining stopword phrases, one per line.
+				Lines of the stopwords file with several words are phrases
+				too.
+		[tokenizer] - the kind of tokens the stopword and dictionary 
+				removals split strings into (see Tokenizer).
 		"""
+		self.tokenizer = Tokenizer(tokenizer)
 
 		self._stopwords = set(['a', 'able', 'about', 'across', 'after', 
 								'all', 'almost', 'also', 'am', 'among', 'an', 
@@ -114,13 +196,22 @@ class Remover:
 		self._apostrophe = ["'", "‘","’"]
 
 
+		phrases = []
 		if stopwordsfile.strip() != '':
-			self._stopwords = set([w.strip().lower() 
-									for w in open(stopwordsfile, 'r')])
+			self._stopwords = _loadWords(stopwordsfile)
+			if isinstance(self._stopwords, WordList):
+				# kept apart in the file, which is not read through
+				phrases.extend(self._stopwords.phrases())
+			else:
+				phrases.extend(w for w in self._stopwords 
+								if len(w.split()) > 1)
+
+		if phrasefile.strip() != '':
+			phrases.extend(open(phrasefile, 'r'))
+		self._phrases = _phraseTrie(phrases)
 
 		if dictionaryfile.strip() != '':
-			self._dictionary = set([w.strip().lower() 
-									for w in open(dictionaryfile, 'r')])
+			self._dictionary = _loadWords(dictionaryfile)
 
 		if articlefile.strip() != '':
 			self._articles = [w.strip() 
@@ -134,16 +225,16 @@ class Remover:
 			self._apostrophe = [w.strip() 
 							for w in open(apostrophefile, 'r').readlines()]
 
+		self._sources = (stopwordsfile, punctuationfile, dictionaryfile,
+						apostrophefile, articlefile, phrasefile)
 		self._compileRegex()
 	
 	def removeStopwords(self, words):
-		"""Remove stopwords from string."""
-		wordList = [w.strip() for w in words.split(' ')]
-		rtnWords = []
-		for word in wordList:
-			if word.lower() not in self._stopwords:
-				rtnWords.append(word)
-		return " ".join(rtnWords)
+		"""Remove stopwords and stopword phrases from string."""
+		if self._phrases:
+			return " ".join(self._stopwordTokens(self.tokenizer.tokens(words))[0])
+		return " ".join(_filterWords(self.tokenizer.tokens(words), 
+									self._stopwords, False))
 
 	def removeStopwordsLine(self, wordLines):
 		"""Remove stopwords from lines."""
@@ -151,7 +242,12 @@ class Remover:
 
 	def removePunctuation(self, words):
 		"""Remove puntuation from string."""
-		return self.__punctuationRegex.sub(' ', words)
+		if self.__punctuationTable is None:
+			return self.__punctuationRegex.sub(' ', words)
+		words = _translateText(words, self.__punctuationTable)
+		if self.__punctuationWideRegex is not None and not _isAscii(words):
+			words = self.__punctuationWideRegex.sub(' ', words)
+		return words
 
 	def removePunctuationLine(self, wordLines):
 		"""Remove puntuation from lines."""
@@ -159,12 +255,8 @@ class Remover:
 
 	def removeNonDictionaryWords(self, words):
 		"""Remove non valid (dictionary) words from string."""
-		wordList = [w.strip() for w in words.split(' ')]
-		rtnWords = []
-		for word in wordList:
-			if word.lower() in self.dictionary:
-				rtnWords.append(word)
-		return " ".join(rtnWords)
+		return " ".join(_filterWords(self.tokenizer.tokens(words), 
+									self._dictionary, True))
 
 	def removeNonDictionaryWordsLine(self, wordLines):
 		"""Remove non valid (dictionary) words from lines."""
@@ -172,7 +264,9 @@ class Remover:
 
 	def removeNumbers(self, words):
 		"""Remove numbers from string."""
-		return re.sub(r'\d', '', words)
+		if _isAscii(words):
+			return _translateText(words, None, b'0123456789')
+		return _digitsRegex.sub('', words)
 
 	def removeNumbersLine(self, wordLines):
 		"""Remove numbers from lines."""
@@ -190,6 +284,10 @@ class Remover:
 		"""Remove articles from the front of string."""
 		return self.__articlesRegex.sub('', words).strip()
 
+	def removeArticlesFromFrontLine(self, wordLines):
+		"""Remove articles from the front of lines."""
+		return self._doPerLine(wordLines, self.removeArticlesFromFront)
+
 	def removeTags(self, words):
 		"""Remove html/xml tags from string."""
 		return re.sub(r'<.*?>', '', words)
@@ -206,7 +304,167 @@ class Remover:
 		"""Remove apostrophes from string, replace with no space."""
 		return self._doPerLine(wordLines, self.removeApostrophes)
 
+	def removeHtml(self, words):
+		"""Remove html markup, script and style content from string, and
+		decode entities."""
+		return HtmlStripper().strip(words)
+
+	def removeHtmlLine(self, wordLines):
+		"""Remove html markup from lines, markup may span lines."""
+		return list(self.removeHtmlIter(wordLines))
+
+	def removeStopwordsIter(self, wordLines):
+		"""Lazily remove stopwords from lines."""
+		return self._iterPerLine(wordLines, self.removeStopwords)
+
+	def removePunctuationIter(self, wordLines):
+		"""Lazily remove puntuation from lines."""
+		return self._iterPerLine(wordLines, self.removePunctuation)
+
+	def removeNonDictionaryWordsIter(self, wordLines):
+		"""Lazily remove non valid (dictionary) words from lines."""
+		return self._iterPerLine(wordLines, self.removeNonDictionaryWords)
+
+	def removeNumbersIter(self, wordLines):
+		"""Lazily remove numbers from lines."""
+		return self._iterPerLine(wordLines, self.removeNumbers)
+
+	def removeExtraSpacesIter(self, wordLines):
+		"""Lazily remove extra spaces from lines."""
+		return self._iterPerLine(wordLines, self.removeExtraSpaces)
+
+	def removeArticlesFromFrontIter(self, wordLines):
+		"""Lazily remove articles from the front of lines."""
+		return self._iterPerLine(wordLines, self.removeArticlesFromFront)
+
+	def removeTagsIter(self, wordLines):
+		"""Lazily remove html/xml tags from lines."""
+		return self._iterPerLine(wordLines, self.removeTags, True)
+
+	def removeApostrophesIter(self, wordLines):
+		"""Lazily remove apostrophes from lines, replace with no space."""
+		return self._iterPerLine(wordLines, self.removeApostrophes, True)
+
+	def removeHtmlIter(self, wordLines):
+		"""Lazily remove html markup from lines, markup may span lines."""
+		stripper = HtmlStripper()
+		for batch in batchLines(wordLines):
+			for line in stripper.feedLine("\n".join(batch)).split("\n"):
+				yield line
+
+	def saveProfile(self, filename):
+		"""Save the word lists and regex patterns to a binary profile file.
+
+		The files this Remover was made from are recorded with their mtime,
+		size and sha1, so loadProfile can tell when the profile is stale. The
+		file is replaced in one step, so readers never see half a profile.
+		"""
+		profile = {'format': self._profileFormat,
+					'python': tuple(sys.version_info[:2]),
+					'sources': self._sourceStamps(self._sources),
+					'stopwords': _profileWords(self._stopwords),
+					'phrases': self._phrases,
+					'dictionary': _profileWords(self._dictionary),
+					'punctuation': self._punctuation,
+					'articles': self._articles,
+					'apostrophe': self._apostrophe,
+					'patterns': (self.__punctuationRegex.pattern,
+								self.__apostropheRegex.pattern,
+								self.__articlesRegex.pattern)}
+		tmpname = filename + '.tmp'
+		out = open(tmpname, 'wb')
+		marshal.dump(profile, out)
+		out.close()
+		getattr(os, 'replace', os.rename)(tmpname, filename)
+
+	@classmethod
+	def loadProfile(cls, filename, stopwordsfile='', punctuationfile='', 
+					dictionaryfile='', apostrophefile='', articlefile='', 
+					phrasefile='', tokenizer='whitespace'):
+		"""Load a Remover saved by saveProfile.
+
+		Returns None if the profile is missing or unreadable, or was not
+		made from the given files as they are now: a file whose mtime or
+		size changed is hashed again and must still match.
+
+		Params are the same as for __init__, with the profile filename first.
+		"""
+		sources = (stopwordsfile, punctuationfile, dictionaryfile,
+					apostrophefile, articlefile, phrasefile)
+		try:
+			profile = _loadMarshal(filename)
+		except (EnvironmentError, ValueError, EOFError, TypeError):
+			return None
+		if (not isinstance(profile, dict) or 
+				profile.get('format') != cls._profileFormat or
+				profile.get('python') != tuple(sys.version_info[:2]) or
+				not cls._sourcesMatch(sources, profile['sources'])):
+			return None
+
+		remover = cls(tokenizer=tokenizer)
+		remover._sources = sources
+		try:
+			remover._stopwords = _profileWords(profile['stopwords'])
+			remover._dictionary = _profileWords(profile['dictionary'])
+		except (EnvironmentError, ValueError):
+			return None
+		remover._phrases = profile['phrases']
+		remover._punctuation = profile['punctuation']
+		remover._articles = profile['articles']
+		remover._apostrophe = profile['apostrophe']
+		punctuation, apostrophe, articles = profile['patterns']
+		remover.__punctuationRegex = re.compile(punctuation)
+		remover.__apostropheRegex = re.compile(apostrophe)
+		remover.__articlesRegex = re.compile(articles)
+		remover._compileTables()
+		return remover
+
 	# private interface
+	_profileFormat = 3
+
+	def _stopwordTokens(self, tokens, final=True):
+		"""Remove stopwords and stopword phrases from a list of tokens.
+
+		One pass over the tokens: at each token the phrase trie is followed
+		as far as the next tokens go, and the longest phrase found there is
+		removed. Empty tokens inside a phrase are removed with it. The work
+		per token depends on the length of the phrases, not their number.
+
+		Returns the tokens kept and, when final is not set, the tokens from
+		where a phrase may go on in tokens that follow (else []).
+		"""
+		stopwords = self._stopwords
+		kept = []
+		i = 0
+		n = len(tokens)
+		while i < n:
+			word = tokens[i].strip()
+			lower = word.lower()
+			node = self._phrases.get(lower)
+			if node is not None:
+				end = None
+				j = i + 1
+				while True:
+					if None in node:
+						end = j
+					while j < n and tokens[j].strip() == '':
+						j += 1
+					if j == n:
+						if not final and len(node) > (None in node):
+							return kept, tokens[i:]
+						break
+					node = node.get(tokens[j].strip().lower())
+					if node is None:
+						break
+					j += 1
+				if end is not None:
+					i = end
+					continue
+			if lower not in stopwords:
+				kept.append(word)
+			i += 1
+		return kept, []
+
 	def _doPerLine(self, lines, function):
 		"""Perform operation (function) on each line in list."""
 		rtnLines = []
@@ -214,6 +472,34 @@ class Remover:
 			rtnLines.append(function(line))
 		return rtnLines
 
+	def _iterPerLine(self, lines, function, batched=False, batchSize=1024):
+		"""Lazily perform operation (function) on each line of an iterable.
+
+		If batched is set, function must work on each line on its own (like
+		the regex removals), and is called once per batchSize lines.
+		"""
+		if not batched:
+			for line in lines:
+				yield function(line)
+			return
+		for batch in batchLines(lines, batchSize):
+			for line in self._doBatch(batch, function):
+				yield line
+
+	def _doBatch(self, lines, function):
+		"""Perform a line independent operation on a list of lines in one call.
+
+		The lines are joined with newlines, which none of the regex removals
+		touch, and split again after one call of function. Numbers and
+		punctuation are not batched: their translation tables are fastest on
+		ASCII lines, and one joined batch is rarely all ASCII.
+		"""
+		rtnLines = function("\n".join(lines)).split("\n")
+		if len(rtnLines) != len(lines):
+			# a line had a newline of its own, or function touched one
+			rtnLines = [function(line) for line in lines]
+		return rtnLines
+
 	def _compileRegex(self):
 		"""Compile regular expressions for implementation."""
 		self.__punctuationRegex = re.compile("|".join(self._punctuation))
@@ -221,7 +507,677 @@ class Remover:
 									"|".join(self._apostrophe)+
 									')(?=[a-zA-Z])')
 		self.__articlesRegex = re.compile('(?i)^('+"|".join(self._articles)+')\s')
-		
+		self._compileTables()
+
+	def _compileTables(self):
+		"""Build the translation table used for punctuation, if possible.
+
+		The table is only used when every punctuation entry is a single
+		character. It maps ASCII punctuation to spaces over the UTF-8 bytes
+		of a string, and a small character class regex handles the
+		punctuation outside ASCII. Otherwise the regex alternation is used.
+		"""
+		self.__punctuationTable = None
+		self.__punctuationWideRegex = None
+		chars = [_literalChar(p) for p in self._punctuation]
+		if not chars or None in chars:
+			return
+		narrow = [c for c in chars if isinstance(c, bytes) or ord(c) < 128]
+		wide = [c for c in chars if c not in narrow]
+		narrow = b''.join(c if isinstance(c, bytes) else c.encode('ascii') 
+						for c in narrow)
+		self.__punctuationTable = _byteTable(narrow, b' ' * len(narrow))
+		if wide:
+			self.__punctuationWideRegex = re.compile(
+						'[' + ''.join(re.escape(c) for c in wide) + ']')
+
+	def _removalPattern(self, operation):
+		"""Return the regex source matching what operation removes.
+
+		Only defined for the operations that replace with nothing and can be
+		merged into one regex ('apostrophes' and 'tags').
+		"""
+		if operation == 'tags':
+			return r'<.*?>'
+		if operation == 'apostrophes':
+			return self.__apostropheRegex.pattern
+		raise ValueError("no removal pattern for '%s'" % operation)
+
+	def _byteFunction(self, operations):
+		"""Return a function doing a stage of operations on UTF-8 bytes, or
+		None if it can not be done there.
+
+		The stage is 'numbers', 'punctuation' (when it has a translation
+		table), or 'tags' and 'apostrophes' (when every apostrophe is one
+		literal character) merged into one regex. The function returns the
+		bytes the stage leaves, or None when the bytes have something only
+		the str stage handles (digits outside ASCII).
+		"""
+		if operations == ['numbers']:
+			def removeNumbers(data):
+				if _wideDigits(data):
+					return None
+				return data.translate(None, b'0123456789')
+			return removeNumbers
+		if operations == ['punctuation']:
+			table = self.__punctuationTable
+			if table is None:
+				return None
+			if self.__punctuationWideRegex is None:
+				return lambda data: data.translate(table)
+			wide = _utf8Regex([c for c in map(_literalChar, self._punctuation)
+								if not isinstance(c, bytes) and ord(c) > 127])
+			return lambda data: wide.sub(b' ', data.translate(table))
+		if [o for o in operations if o not in ('apostrophes', 'tags')]:
+			return None
+		if 'apostrophes' in operations:
+			chars = [_literalChar(p) for p in self._apostrophe]
+			if not chars or None in chars:
+				return None
+		# ASCII bytes never occur inside multi-byte sequences, and . in
+		# <.*?> matches every byte of one as it matches the character
+		regex = re.compile("|".join(self._removalPattern(o) 
+									for o in operations).encode('utf-8'))
+		return lambda data: regex.sub(b'', data)
+
+	@classmethod
+	def _sourceStamps(cls, sources):
+		"""Return (filename, mtime, size, sha1) for each source file given."""
+		stamps = []
+		for filename in sources:
+			if filename.strip() == '':
+				stamps.append(None)
+			else:
+				stat = os.stat(filename)
+				stamps.append((filename, stat.st_mtime, stat.st_size, 
+								_fileDigest(filename)))
+		return tuple(stamps)
+
+	@classmethod
+	def _sourcesMatch(cls, sources, stamps):
+		"""True <=> the profile stamps still describe the source files."""
+		if len(sources) != len(stamps):
+			return False
+		for filename, stamp in zip(sources, stamps):
+			if filename.strip() == '' or stamp is None:
+				if filename.strip() != '' or stamp is not None:
+					return False
+				continue
+			if stamp[0] != filename:
+				return False
+			try:
+				stat = os.stat(filename)
+				if (stat.st_mtime, stat.st_size) != tuple(stamp[1:3]):
+					if _fileDigest(filename) != stamp[3]:
+						return False
+			except EnvironmentError:
+				return False
+		return True
+
+
+_digitsRegex = re.compile(r'\d')
+_asciiBytes = bytearray(range(128))
+_wideSpaces = []
+
+def _utf8Regex(chars):
+	"""Compile a bytes regex matching the UTF-8 encoding of any of chars."""
+	groups = OrderedDict()
+	for c in sorted(set(chars)):
+		code = c.encode('utf-8')
+		groups.setdefault(code[:-1], []).append(re.escape(code[-1:]))
+	return re.compile(b'|'.join(re.escape(lead) + b'[' + b''.join(last) + b']'
+								for lead, last in groups.items()))
+
+def _wideDigits(data):
+	"""Return True if UTF-8 bytes have digits outside ASCII (as \\d)."""
+	# what is left are the whole characters outside ASCII
+	wide = data.translate(None, _asciiBytes).decode('utf-8', 'replace')
+	return _digitsRegex.search(wide) is not None
+
+def _wideEnds(lines):
+	"""Return True if a line of UTF-8 bytes starts or ends with white space
+	outside ASCII (as str.strip)."""
+	if not _wideSpaces:
+		# no white space is past U+3000
+		space = _utf8Regex(filter(str.isspace, map(chr, range(128, 0x3001))))
+		_wideSpaces.extend([space.match, 
+							re.compile(b'(?:' + space.pattern + b')\\Z').search])
+	first, last = _wideSpaces
+	for line in lines:
+		# such a space is at most 3 bytes, all of them outside ASCII
+		if ((line[:1] > b'\x7f' and first(line) is not None) or 
+				(line[-1:] > b'\x7f' and 
+				last(line, max(len(line) - 3, 0)) is not None)):
+			return True
+	return False
+
+def _filterWords(tokens, words, wanted):
+	"""Return the stripped tokens whose lower case form being in words
+	equals wanted (False removes the words, True keeps only them)."""
+	rtnWords = []
+	for word in tokens:
+		word = word.strip()
+		if (word.lower() in words) == wanted:
+			rtnWords.append(word)
+	return rtnWords
+
+_pythonFilterWords = _filterWords
+if _speedups is not None:
+	_filterWords = _speedups.filterWords
+
+def _loadWords(filename):
+	"""Load a stopword or dictionary file: a WordList for a word list file,
+	else a set of its lines (stripped and lowercase)."""
+	if WordList.isWordList(filename):
+		return WordList(filename)
+	return set([w.strip().lower() for w in open(filename, 'r')])
+
+def _profileWords(words):
+	"""Turn a word list into what a profile keeps, and back: a mapped
+	WordList is kept as its filename, a set as it is."""
+	if isinstance(words, WordList):
+		return words.filename
+	if isinstance(words, (set, frozenset)):
+		return words
+	return WordList(words)
+
+def _phraseTrie(phrases):
+	"""Build a token trie of phrases: nested dicts keyed by lowercase word,
+	where a None key marks the end of a phrase."""
+	trie = {}
+	for phrase in phrases:
+		words = phrase.lower().split()
+		if not words:
+			continue
+		node = trie
+		for word in words:
+			node = node.setdefault(word, {})
+		node[None] = True
+	return trie
+
+# bytes.maketrans is python 3 only, python 2 byte strings use string's
+_byteTable = getattr(bytes, 'maketrans', None) or string.maketrans
+# str.isascii is python 3.7+; a python 2 str is made of bytes, which the
+# byte tables translate directly
+if bytes is str:
+	_isAscii = lambda text: isinstance(text, bytes)
+else:
+	_isAscii = getattr(str, 'isascii', lambda text: False)
+
+def _translateText(text, table, delete=b''):
+	"""Run a byte translation table (and deleted bytes) over text.
+
+	A str is translated through its UTF-8 encoding. ASCII bytes never occur
+	inside multi-byte sequences, so a table that only maps ASCII bytes is
+	safe to use on any string.
+	"""
+	if isinstance(text, bytes):
+		return text.translate(table, delete)
+	data = text.encode('utf-8', 'surrogatepass').translate(table, delete)
+	return data.decode('utf-8', 'surrogatepass')
+
+def _literalChar(pattern):
+	"""Return the one character a regex pattern matches literally, or None."""
+	if len(pattern) == 1 and pattern not in '.^$*+?[]|()\\':
+		return pattern
+	if len(pattern) == 2 and pattern[0] == '\\' and not pattern[1].isalnum():
+		return pattern[1]
+	return None
+
+def _fileDigest(filename):
+	"""Return the sha1 hex digest of a file's content."""
+	digest = hashlib.sha1()
+	f = open(filename, 'rb')
+	for block in iter(lambda: f.read(1 << 16), b''):
+		digest.update(block)
+	f.close()
+	return digest.hexdigest()
+
+def _loadMarshal(filename):
+	"""Load a marshal file, reading it through mmap where possible."""
+	f = open(filename, 'rb')
+	try:
+		try:
+			data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		except (ValueError, EnvironmentError):
+			# empty files can not be mapped
+			return marshal.loads(f.read())
+		try:
+			return marshal.loads(data)
+		except TypeError:
+			# python 2 only loads from a str
+			return marshal.loads(data[:])
+		finally:
+			data.close()
+	finally:
+		f.close()
+
+
+class Tokenizer:
+	"""Splits strings into the tokens the word level operations work on.
+
+	The kind of tokens is chosen once, when the Tokenizer is made, as a
+	single C level scan (str.split or the findall of a compiled regex), so
+	no work is spent per call on choosing it:
+	* 'whitespace' -- runs of any white space, tabs and non-breaking
+		spaces too, with no empty tokens. The default.
+	* 'space' -- every single ' ', as the word operations used to split.
+		Runs of spaces give empty tokens, which keep the spaces in the
+		output, and a tab does not split words.
+	* 'words' -- runs of word characters (of any script), with
+		apostrophes inside words; everything else is dropped.
+	* any other string -- a regex matching one token, whose groups must
+		not capture.
+	On python 2 a byte string is split on ASCII white space only, and is
+	decoded from UTF-8 for a regex.
+
+	public interface:
+	* __init__ -- takes the kind of tokens.
+	* tokens -- return the list of tokens of a string.
+
+	Attributes:
+	kind - the kind of tokens, as given.
+	"""
+
+	KINDS = ('whitespace', 'space', 'words')
+
+	_wordsPattern = r"\w+(?:['’]\w+)*"
+
+	def __init__(self, kind='whitespace'):
+		"""Get a new Tokenizer instance.
+
+		Params:
+		[kind] - 'whitespace', 'space', 'words' or a token regex. A regex
+				that does not compile, or has capturing groups, raises
+				ValueError.
+		"""
+		self.kind = kind
+		if kind == 'whitespace':
+			self._scan = _splitWhitespace
+		elif kind == 'space':
+			self._scan = _splitSpace
+		else:
+			pattern = self._wordsPattern if kind == 'words' else kind
+			if isinstance(pattern, bytes) and bytes is str: # python 2
+				pattern = pattern.decode('utf-8')
+			try:
+				regex = re.compile(pattern, re.UNICODE)
+			except re.error as e:
+				raise ValueError("bad token pattern '%s': %s" % (kind, e))
+			if regex.groups:
+				raise ValueError("the token pattern '%s' has capturing "
+								"groups, use (?:...)" % kind)
+			self._scan = regex.findall
+			if bytes is str:
+				self._scan = lambda text, findall=regex.findall: (
+								_utf8Tokens(findall, text))
+
+	def tokens(self, text):
+		"""Return the list of tokens of text."""
+		return self._scan(text)
+
+def _splitWhitespace(text):
+	return text.split()
+
+def _splitSpace(text):
+	return text.split(' ')
+
+def _utf8Tokens(findall, text):
+	"""Run a regex findall over a python 2 byte string as UTF-8 text."""
+	if not isinstance(text, bytes):
+		return findall(text)
+	return [t.encode('utf-8') for t in findall(text.decode('utf-8', 'replace'))]
+
+
+class StemCache:
+	"""Remembers word -> stem results, evicting the least recently used.
+
+	public interface:
+	* __init__ -- takes the maximum number of words to keep (None for no
+		limit).
+	* get -- return the cached stem of a word, or None, counting the hit or
+		miss.
+	* put -- remember the stem of a word.
+	* load -- preload the cache from a file written by dump.
+	* dump -- write the cache to a file, least recently used first.
+	* clear -- forget all words and reset the counters.
+
+	All methods hold a lock, so a cache can be shared between threads.
+
+	Attributes:
+	maxSize - maximum number of words kept.
+	hits - number of get calls that found the word.
+	misses - number of get calls that did not.
+	"""
+
+	def __init__(self, maxSize=100000):
+		"""Get a new StemCache instance.
+
+		Params:
+		[maxSize] - maximum number of words to keep, None for no limit.
+		"""
+		self.maxSize = maxSize
+		self.hits = 0
+		self.misses = 0
+		self._stems = OrderedDict()
+		self._lock = threading.Lock()
+
+	def __len__(self):
+		return len(self._stems)
+
+	def get(self, word):
+		"""Return the cached stem of word or None."""
+		with self._lock:
+			stem = self._stems.pop(word, None)
+			if stem is None:
+				self.misses += 1
+				return None
+			self._stems[word] = stem
+			self.hits += 1
+			return stem
+
+	def put(self, word, stem):
+		"""Remember stem as the stem of word."""
+		with self._lock:
+			self._stems.pop(word, None)
+			self._stems[word] = stem
+			if self.maxSize is not None and len(self._stems) > self.maxSize:
+				self._stems.popitem(last=False)
+
+	def load(self, filename):
+		"""Preload the cache from a file of tab separated word/stem lines."""
+		for line in open(filename, 'r'):
+			pair = line.rstrip('\n').split('\t')
+			if len(pair) == 2:
+				self.put(pair[0], pair[1])
+
+	def dump(self, filename):
+		"""Write the cache to filename, least recently used words first.
+
+		Words containing a tab or newline can not be written and are skipped.
+		"""
+		with self._lock:
+			items = list(self._stems.items())
+		out = open(filename, 'w')
+		for word, stem in items:
+			if '\t' not in word and '\n' not in word:
+				out.write(word + '\t' + stem + '\n')
+		out.close()
+
+	def clear(self):
+		"""Forget all cached words and reset the counters."""
+		with self._lock:
+			self._stems.clear()
+		self.hits = 0
+		self.misses = 0
+
+
+class WordList:
+	"""A compact, read only set of words kept in a memory mapped file.
+
+	public interface:
+	* build -- (static) write a word list file from words.
+	* isWordList -- (static) tell whether a file is a word list file.
+	* __init__ -- takes the filename of a word list file.
+	* __contains__ -- test whether a word is in the list.
+	* __len__, __iter__ -- the number of words, and the words in sorted
+		order.
+	* phrases -- the entries of several words (stopword phrases).
+
+	The file holds the sorted UTF-8 words back to back with their offsets,
+	and an open addressing hash table of word numbers at most half full, so
+	a lookup hashes the word once and compares it with about one stored
+	word. The file is mapped read only: every process using it shares the
+	one copy in the page cache, and a word costs its length plus 12 bytes.
+
+	A file may also hold a Bloom filter of the words, checked before the
+	hash table. Most words that are not in the list then only touch the
+	filter, about 11 bits a word for a 1% false positive rate, and not the
+	much larger table and words; the false positives go on to the table, so
+	the answer is still exact. The filter is blocked: the bits of a word are
+	all in one 64 bit block, so a lookup touches it once.
+
+	A Remover loads a word list file given as its stopword or dictionary
+	file, in place of a set. The numbers of the entries of several words
+	are kept apart too, so the stopword phrases are found without reading
+	every word. Files of the previous format (no phrase numbers) are still
+	read, their phrases are found by going through the words.
+
+	Attributes:
+	filename - the word list file.
+	bloomBlocks - number of 64 bit blocks of the Bloom filter (0 when there
+		is none).
+	bloomHashes - number of bits set for each word.
+	"""
+
+	# magic, number of words, number of hash table slots (a power of 2),
+	# Bloom filter blocks and hashes, number of phrases
+	_header = struct.Struct('<8sIIIII')
+	_magic = b'TCWORDS3'
+	# the format before phrases were kept, its header has no phrase count
+	_oldHeader = struct.Struct('<8sIIII')
+	_oldMagic = b'TCWORDS2'
+
+	@staticmethod
+	def build(words, filename, falsePositiveRate=0):
+		"""Write the (str or UTF-8 bytes) words to a word list file.
+
+		With a falsePositiveRate (0 < rate < 1) a Bloom filter with that
+		rate is added. The file is replaced in one step, so readers never
+		see half a list.
+		"""
+		words = sorted(set(_utf8(w) for w in words))
+		slots = 1
+		while slots < 2 * len(words):
+			slots *= 2
+		bloomBlocks, bloomHashes = _bloomSize(len(words), falsePositiveRate)
+		bloom = [0] * bloomBlocks
+		for word in (words if bloomBlocks else []):
+			block, bits = _bloomBits(word, bloomBlocks, bloomHashes)
+			bloom[block] |= bits
+		phrases = [index for index, word in enumerate(words) 
+					if len(word.decode('utf-8', 'replace').split()) > 1]
+		offsets = []
+		position = (WordList._header.size + 8 * bloomBlocks + 
+					4 * (len(words) + 1) + 4 * slots + 4 * len(phrases))
+		for word in words:
+			offsets.append(position)
+			position += len(word)
+		offsets.append(position)
+		table = [0] * slots
+		mask = slots - 1
+		for index, word in enumerate(words):
+			slot = zlib.crc32(word) & mask
+			while table[slot]:
+				slot = (slot + 1) & mask
+			table[slot] = index + 1
+		tmpname = filename + '.tmp'
+		out = open(tmpname, 'wb')
+		out.write(WordList._header.pack(WordList._magic, len(words), slots, 
+										bloomBlocks, bloomHashes, len(phrases)))
+		out.write(struct.pack('<%dQ' % bloomBlocks, *bloom))
+		out.write(struct.pack('<%dI' % len(offsets), *offsets))
+		out.write(struct.pack('<%dI' % slots, *table))
+		out.write(struct.pack('<%dI' % len(phrases), *phrases))
+		for word in words:
+			out.write(word)
+		out.close()
+		getattr(os, 'replace', os.rename)(tmpname, filename)
+
+	@staticmethod
+	def isWordList(filename):
+		"""Return True if filename is a word list file."""
+		f = open(filename, 'rb')
+		magic = f.read(len(WordList._magic))
+		f.close()
+		return magic in (WordList._magic, WordList._oldMagic)
+
+	def __init__(self, filename, seenSize=65536):
+		"""Map a word list file written by build.
+
+		Params:
+		filename - path to the word list file.
+		[seenSize] - number of looked up words to remember the answer for.
+				Words in text are mostly the same few, which then skip the
+				hash table.
+		"""
+		self.filename = filename
+		self._seen = {}
+		self._seenSize = seenSize
+		f = open(filename, 'rb')
+		try:
+			self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		finally:
+			f.close()
+		magic = self._data[:len(self._magic)]
+		if magic == self._oldMagic:
+			header = self._oldHeader
+			(magic, self._count, slots, self.bloomBlocks, 
+				self.bloomHashes) = header.unpack_from(self._data)
+			phrases = None
+		elif magic == self._magic:
+			header = self._header
+			(magic, self._count, slots, self.bloomBlocks, self.bloomHashes, 
+				phrases) = header.unpack_from(self._data)
+		else:
+			raise ValueError("%s is not a word list file" % filename)
+		self._mask = slots - 1
+		start = header.size
+		self._bloom = _packedInts(self._data, start, self.bloomBlocks, 'Q')
+		start += 8 * self.bloomBlocks
+		self._offsets = _packedInts(self._data, start, self._count + 1, 'I')
+		start += 4 * (self._count + 1)
+		self._table = _packedInts(self._data, start, slots, 'I')
+		start += 4 * slots
+		self._phrases = None
+		if phrases is not None:
+			self._phrases = [_packedInts(self._data, start, phrases, 'I'), 
+							phrases]
+
+	def __contains__(self, word):
+		found = self._seen.get(word)
+		if found is None:
+			found = self._find(word)
+			if len(self._seen) >= self._seenSize:
+				self._seen.clear()
+			self._seen[word] = found
+		return found
+
+	def _find(self, word):
+		"""Look word up in the Bloom filter and the hash table."""
+		if not isinstance(word, bytes):
+			word = word.encode('utf-8', 'surrogatepass')
+		if self.bloomBlocks:
+			block, bits = _bloomBits(word, self.bloomBlocks, self.bloomHashes)
+			if self._bloom[block] & bits != bits:
+				return False
+		table, offsets, data, mask = (self._table, self._offsets, self._data,
+									self._mask)
+		slot = zlib.crc32(word) & mask
+		index = table[slot]
+		while index:
+			if data[offsets[index - 1]:offsets[index]] == word:
+				return True
+			slot = (slot + 1) & mask
+			index = table[slot]
+		return False
+
+	def __len__(self):
+		return self._count
+
+	def __iter__(self):
+		offsets, data = self._offsets, self._data
+		for index in range(self._count):
+			word = data[offsets[index]:offsets[index + 1]]
+			yield word if bytes is str else word.decode('utf-8', 
+														'surrogatepass')
+
+	def phrases(self):
+		"""Return the entries of several words."""
+		if self._phrases is None:
+			return [w for w in self if len(w.split()) > 1]
+		offsets, data = self._offsets, self._data
+		numbers, count = self._phrases
+		phrases = []
+		for n in range(count):
+			index = numbers[n]
+			word = data[offsets[index]:offsets[index + 1]]
+			phrases.append(word if bytes is str else 
+							word.decode('utf-8', 'surrogatepass'))
+		return phrases
+
+	def __reduce__(self):
+		# other processes map the file again
+		return (WordList, (self.filename,))
+
+def _bloomSize(count, falsePositiveRate):
+	"""Return the (blocks, hashes) of the smallest blocked Bloom filter of
+	count words with at most the given false positive rate, (0, 0) for no
+	filter."""
+	if not 0 < falsePositiveRate < 1:
+		return 0, 0
+	best = None
+	for hashes in range(1, 6):
+		# start from the size of a plain Bloom filter and grow, blocks
+		# fill unevenly so they need a few more bits
+		blocks = int(math.ceil(-count * math.log(falsePositiveRate) / 
+								math.log(2) ** 2 / 64))
+		blocks = max(blocks, 1)
+		while _bloomRate(count, blocks, hashes) > falsePositiveRate:
+			blocks += blocks // 32 + 1
+		if best is None or blocks < best[0]:
+			best = (blocks, hashes)
+	return best
+
+def _bloomRate(count, blocks, hashes):
+	"""Return the false positive rate of a blocked Bloom filter: the words
+	in a block follow a Poisson distribution."""
+	mean = count / float(blocks)
+	rate = 0.0
+	weight = math.exp(-mean)
+	for words in range(int(mean + 10 * math.sqrt(mean) + 20)):
+		rate += weight * (1 - (63 / 64.0) ** (words * hashes)) ** hashes
+		weight *= mean / (words + 1)
+	return rate
+
+def _bloomBits(word, blocks, hashes):
+	"""Return the block and the bits of a UTF-8 word in a blocked Bloom
+	filter: crc32 picks the block, and each 6 bits of adler32 (spread by a
+	multiply) one bit in it."""
+	second = (zlib.adler32(word) * 0x9e3779b1) & 0xffffffff
+	bits = 0
+	for i in range(hashes):
+		bits |= 1 << ((second >> (6 * i)) & 63)
+	return (zlib.crc32(word) & 0xffffffff) % blocks, bits
+
+def _utf8(word):
+	"""Return word as UTF-8 bytes."""
+	if isinstance(word, bytes):
+		return word
+	return word.encode('utf-8', 'surrogatepass')
+
+class _PackedInts:
+	"""Index little endian unsigned ints in a buffer without copying them."""
+
+	def __init__(self, data, start, code):
+		self._data = data
+		self._start = start
+		self._unpack = struct.Struct('<' + code).unpack_from
+		self._size = struct.calcsize(code)
+
+	def __getitem__(self, index):
+		return self._unpack(self._data, self._start + self._size * index)[0]
+
+def _packedInts(data, start, count, code):
+	"""Return an indexable view of count little endian unsigned ints in
+	data, of the struct format code 'I' or 'Q'."""
+	if (sys.byteorder == 'little' and hasattr(memoryview, 'cast') and 
+			struct.calcsize(code) == struct.calcsize('<' + code)):
+		size = struct.calcsize(code)
+		return memoryview(data)[start:start + size * count].cast(code)
+	# python 2 memoryviews can not be cast
+	return _PackedInts(data, start, code)
+
 ##########################################################################
 # Following is a porter stemmer implementation that was freely available 
 # on the internet. I included this in this file to simplify the 
@@ -258,7 +1214,7 @@ release 2: July 2008
 """
 class PorterStemmer:
 
-	def __init__(self):
+	def __init__(self, cache=None, tokenizer=None):
 		"""The main part of the stemming algorithm starts here.
 		b is a buffer holding a word to be stemmed. The letters are in b[k0],
 		b[k0+1] ... ending at b[k]. In fact k0 = 0 in this demo program. k is
@@ -267,12 +1223,26 @@ class PorterStemmer:
 
 		Note that only lower case sequences are stemmed. Forcing to lower case
 		should be done before stem(...) is called.
+
+		cache is the StemCache used by stemWord, a default sized one is made
+		if not given, unless the compiled stem is used: it stems faster than
+		the cache looks words up. Pass False to stem every word without
+		caching.
+
+		tokenizer is the Tokenizer stemWords splits strings with, a
+		whitespace one if not given.
 		"""
 
 		self.b = ""  # buffer for word to be stemmed
 		self.k = 0
 		self.k0 = 0
 		self.j = 0	 # j is a general offset into the string
+		if cache is None:
+			cache = StemCache() if _speedups is None else False
+		if cache is False:
+			cache = None
+		self.cache = cache
+		self.tokenizer = tokenizer if tokenizer is not None else Tokenizer()
 
 	def cons(self, i):
 		"""cons(i) is TRUE <=> b[i] is a consonant."""
@@ -541,13 +1511,22 @@ class PorterStemmer:
 
 	def stemWords(self, words):
 		rtnLines = []
-		wordLine = [w.strip() for w in words.split(" ")]
+		wordLine = [w.strip() for w in self.tokenizer.tokens(words)]
 		for word in wordLine:
 			rtnLines.append(self.stemWord(word))
 		return " ".join(rtnLines)
 
+	def stemWordsLine(self, wordLines):
+		return [self.stemWords(words) for words in wordLines]
+
 	def stemWord(self, word):
-		return self.stem(word, 0, len(word)-1)
+		if self.cache is None:
+			return stem(word)
+		rtnStem = self.cache.get(word)
+		if rtnStem is None:
+			rtnStem = stem(word)
+			self.cache.put(word, rtnStem)
+		return rtnStem
 
 	def stem(self, p, i, j):
 		"""In stem(p,i,j), p is a char pointer, and the string to be stemmed
@@ -558,148 +1537,2613 @@ class PorterStemmer:
 		i <= k <= j. To turn the stemmer into a module, declare 'stem' as
 		extern, and delete the remainder of this file.
 		"""
-		# copy the parameters into statics
-		self.b = p
-		self.k = j
-		self.k0 = i
-		if self.k <= self.k0 + 1:
-			return self.b # --DEPARTURE--
-
-		# With this line, strings of length 1 or 2 don't go through the
-		# stemming process, although no mention is made of this in the
-		# published algorithm. Remove the line to match the published
-		# algorithm.
-
-		self.step1ab()
-		self.step1c()
-		self.step2()
-		self.step3()
-		self.step4()
-		self.step5()
-		return self.b[self.k0:self.k+1]
-######################## END #############################################
+		if j <= i + 1:
+			return p # --DEPARTURE--
+		# the work is done by the stateless stem() below, so one instance can
+		# be shared between threads
+		return stem(p[i:j+1])
+
 ##########################################################################
+# Stateless, table driven version of the algorithm above. The word being
+# stemmed is passed around as a string holding exactly b[k0..k] (k0 is
+# always 0), so nothing is kept between calls and stem() can be called from
+# many threads at once.
+#
+# The consonant/vowel pattern of the word ('c' or 'v' for each letter) is
+# worked out once, in _pattern, and cut and extended along with the word:
+# cons(i) only depends on b[0..i], so the pattern of what is left of a word
+# never changes. m() is then the number of 'vc' pairs in the pattern, and
+# the suffixes of steps 2 to 4 are looked up in tables keyed by the last two
+# letters of the word instead of being tried by a chain of ends() calls.
+##########################################################################
+class _PatternTable(dict):
+	"""Translation table of letters to 'c' (consonant) or 'v' (vowel), y
+	is left to be worked out from the letter before it."""
 
-if __name__ == "__main__":
-	parser = argparse.ArgumentParser(
-				prog='./text_cleaner.py', 
-				description="""Cleans* text. \n*cleaning means 
-							lowercasing, removing things from strings, 
-							and stemming.""")
-	parser.add_argument('--stopword-file', 
-				dest='stopword_file', 
-				default='', 
-				help="""use the specified file for stopwords. If specified, 
-						stopwords will be removed and replaced with nothing.""", 
-				metavar="FILE")
-	parser.add_argument('--dict-file', 
-				dest='dict_file', 
-				default='', 
-				help="""use the specified file for dictionary words. If this 
-						options is specified only words found in the dictionary 
-						will be used.""", 
-				metavar="FILE")
-	parser.add_argument('--punct-file', 
-				dest='punct_file', 
-				default='', 
-				help="""use the specified file for punctuation. If specified,
-						punctuation is removed and replaced with a space.""", 
-				metavar="FILE")
-	parser.add_argument('--apost-file', 
-				dest='apost_file', 
-				default='', 
-				help="""use the specified file for apostrophes. If specified, 
-						apostrophes are remove and replaced with nothing.""", 
-				metavar="FILE")
-	parser.add_argument('--art-file', 
-				dest='article_file', 
-				default='', 
-				help="""use the specified file for articles. If specified, the
-						articles will be removed from the front of strings and
-						replaced with nothing.""", 
-				metavar="FILE")
-	parser.add_argument('-d', 
-				'--output-delimiter', 
-				dest='output_delimiter', 
-				help="""Specifies output delimiter. Default is a space between 
-						words.""", 
-				default='space',
-				metavar="[space|newline|tab|(characters)]")
-	parser.add_argument('-L', 
-				'--line-mode', 
-				action='store_true', 
-				default=False, 
-				dest='line_mode', 
-				help="""Output the words in line mode. Lines are preserved. 
-						Using this option nullifies the output delimiter options 
-						specified.""")
+	def __missing__(self, codepoint):
+		return 'c'
 
-	parser.add_argument('-A', '--remove-articles', 
-				dest='articles', 
-				action='store_true', 
-				default=False, 
-				help="""Remove articles from the beginning of lines.""")
-	parser.add_argument('-n', '--remove-numbers', 
-				dest='numbers', 
-				action='store_true', 
-				default=False, 
-				help="""Remove numbers.""")
-	parser.add_argument('-a', '--remove-apostrophes', 
-				dest='apostrophes', 
-				action='store_true', 
-				default=False, 
-				help="""Remove apostrophes and replaced with nothing.""")
-	parser.add_argument('-t', '--remove-tags', 
-				dest='tags', 
-				action='store_true', 
-				default=False, 
-				help="""Remove html/xml tags.""")
-	parser.add_argument('-p', '--remove-punctuation', 
-				dest='punctuation', 
-				action='store_true', 
-				default=False, 
-				help="""Remove punctuation replacing with a space.""")
-	parser.add_argument('-S', '--remove-stopwords', 
-				dest='stopwords', 
-				action='store_true', 
-				default=False, 
-				help="""Remove stopwords.""")
-	parser.add_argument('-w', '--remove-words', 
-				dest='words', 
-				action='store_true', 
-				default=False, 
-				help="""Remove non-dictionary words.""")
-	parser.add_argument('-e', '--remove-spaces',
-				dest='spaces', 
-				action='store_true', 
-				default=False, 
-				help="""Remove extra spaces.""")
+if bytes is str:
+	# python 2 strings are bytes, translated with a 256 byte table
+	_patternTable = ''.join('v' if ch in 'aeiou' else 'y' if ch == 'y' else 'c'
+							for ch in map(chr, range(256)))
+else:
+	_patternTable = _PatternTable((ord(ch), 'v' if ch in 'aeiou' else 'c')
+								for ch in string.ascii_lowercase)
+	_patternTable[ord('y')] = 'y'
 
-	parser.add_argument('-l', 
-				'--lowercase', 
-				action='store_true', 
-				default=False, 
-				dest='lowercase', 
-				help='lowercase words.')
-	parser.add_argument('-s', 
-				'--stem-words', 
-				action='store_true', 
-				default=False, 
-				dest='stem', 
-				help='stem the words (using a porter stemmer).')
-	parser.add_argument("-i", 
-				"--input-file", 
-				dest="input_file", 
-				nargs='?', 
-				type=argparse.FileType('r'), 
-				default=sys.stdin, 
-				help="input file", 
-				metavar="FILE")
+def _pattern(b):
+	"""Return the consonant/vowel pattern of b, a 'c' or 'v' per letter."""
+	pattern = b.translate(_patternTable)
+	if 'y' not in pattern:
+		return pattern
+	# y is a consonant at the start and after a vowel, else a vowel
+	letters = list(pattern)
+	previous = 'v'
+	for i, ch in enumerate(letters):
+		if ch == 'y':
+			ch = letters[i] = 'c' if previous == 'v' else 'v'
+		previous = ch
+	return ''.join(letters)
 
-	args = parser.parse_args()
-	
-	if args.stopword_file != '':
-		args.stopwords = True
+def _cvc(b, p, i):
+	"""True <=> i-2,i-1,i is consonant - vowel - consonant, and the second
+	consonant is not w, x or y.
+	"""
+	return i >= 2 and p[i-2:i+1] == 'cvc' and b[i] not in 'wxy'
+
+def _suffixTable(rules):
+	"""Turn (suffix, replacement) rules into a table keyed by the last two
+	letters of the suffix, holding (suffix, length, replacement, pattern of
+	the replacement) in the order the rules are tried."""
+	table = {}
+	for suffix, replacement in rules:
+		table.setdefault(suffix[-2:], []).append((suffix, len(suffix), 
+										replacement, _pattern(replacement)))
+	return dict((key, tuple(entries)) for key, entries in table.items())
+
+# see PorterStemmer.step2
+_step2Table = _suffixTable([
+	("ational", "ate"), ("tional", "tion"), ("enci", "ence"), 
+	("anci", "ance"), ("izer", "ize"), 
+	("bli", "ble"), # --DEPARTURE--
+	("alli", "al"), ("entli", "ent"), ("eli", "e"), ("ousli", "ous"), 
+	("ization", "ize"), ("ation", "ate"), ("ator", "ate"), ("alism", "al"), 
+	("iveness", "ive"), ("fulness", "ful"), ("ousness", "ous"), 
+	("aliti", "al"), ("iviti", "ive"), ("biliti", "ble"), 
+	("logi", "log")]) # --DEPARTURE--
+
+# see PorterStemmer.step3
+_step3Table = _suffixTable([
+	("icate", "ic"), ("ative", ""), ("alize", "al"), ("iciti", "ic"), 
+	("ical", "ic"), ("ful", ""), ("ness", "")])
+
+# see PorterStemmer.step4, the replacement is always ''; -ion is only
+# taken off after s or t
+_step4Table = _suffixTable((suffix, "") for suffix in (
+	"al", "ance", "ence", "er", "ic", "able", "ible", "ant", "ement", "ment",
+	"ent", "ion", "ou", "ism", "ate", "iti", "ous", "ive", "ize"))
+
+def stem(word):
+	"""Return the porter stem of a lower case word.
+
+	Keeps no state between calls, so it is safe to call from many threads at
+	once. Words of length 1 or 2 are returned as they are (--DEPARTURE--).
+	"""
+	if len(word) <= 2:
+		return word
+	b = word
+	p = _pattern(word)
+
+	# step1ab: get rid of plurals and -ed or -ing
+	last = b[-1]
+	if last == 's':
+		if b.endswith("sses") or b.endswith("ies"):
+			b, p = b[:-2], p[:-2]
+		elif b[-2] != 's':
+			b, p = b[:-1], p[:-1]
+		last = b[-1]
+	suffix = 0
+	if last == 'd' and b[-2] == 'e':
+		if b.endswith("eed"):
+			if p.count('vc', 0, len(p) - 3) > 0:
+				b, p = b[:-1], p[:-1]
+		else:
+			suffix = 2
+	elif last == 'g' and b.endswith("ing"):
+		suffix = 3
+	if suffix and p.find('v', 0, len(p) - suffix) != -1:
+		b, p = b[:-suffix], p[:-suffix]
+		end = b[-2:]
+		if end == "at" or end == "bl" or end == "iz":
+			b, p = b + 'e', p + 'v'
+		elif len(b) >= 2 and b[-1] == b[-2] and p[-1] == 'c':
+			if b[-1] not in 'lsz':
+				b, p = b[:-1], p[:-1]
+		elif p.count('vc') == 1 and _cvc(b, p, len(b) - 1):
+			b, p = b + 'e', p + 'v'
+
+	# step1c: turn terminal y to i when there is another vowel in the stem
+	if b[-1] == 'y' and p.find('v', 0, len(p) - 1) != -1:
+		b, p = b[:-1] + 'i', p[:-1] + 'v'
+
+	# step2 and step3 replace the first suffix of their table that b ends
+	# with, if the rest of b has m() > 0
+	for table in (_step2Table, _step3Table):
+		for suffix, length, replacement, pattern in table.get(b[-2:], ()):
+			if b.endswith(suffix):
+				if p.count('vc', 0, len(p) - length) > 0:
+					b, p = b[:-length] + replacement, p[:-length] + pattern
+				break
+
+	# step4: take off -ant, -ence etc., in context <c>vcvc<v>
+	for suffix, length, replacement, pattern in _step4Table.get(b[-2:], ()):
+		if b.endswith(suffix):
+			j = len(b) - length
+			if (suffix != "ion" or (j > 0 and b[j-1] in 'st')) and \
+					p.count('vc', 0, j) > 1:
+				b, p = b[:j], p[:j]
+			break
+
+	# step5: remove a final -e if m() > 1, and change -ll to -l if m() > 1
+	m = p.count('vc')
+	if b[-1] == 'e' and (m > 1 or (m == 1 and not _cvc(b, p, len(b) - 2))):
+		b, p = b[:-1], p[:-1]
+	if m > 1 and b[-1] == 'l' and b[-2:] == 'll':
+		b = b[:-1]
+	return b
+
+# the compiled stem gives the same stems, the python one is kept to check it
+_pythonStem = stem
+if _speedups is not None:
+	stem = _speedups.stem
+######################## END #############################################
+##########################################################################
+
+def chunkLines(lines, chunkSize=65536):
+	"""Group lines into chunks of about chunkSize characters.
+
+	Concatenating the chunks gives the same string as " ".join(lines). Every
+	chunk but the last ends with the joining space, so no word is ever split
+	between two chunks.
+	"""
+	buf = []
+	size = 0
+	prev = None
+	for line in lines:
+		if prev is not None:
+			buf.append(prev)
+			size += len(prev) + 1
+			if size >= chunkSize:
+				buf.append('')
+				yield " ".join(buf)
+				buf = []
+				size = 0
+		prev = line
+	if prev is not None:
+		buf.append(prev)
+		yield " ".join(buf)
+
+def batchLines(lines, batchSize=1024):
+	"""Group an iterable of lines into lists of at most batchSize lines."""
+	batch = []
+	for line in lines:
+		batch.append(line)
+		if len(batch) >= batchSize:
+			yield batch
+			batch = []
+	if batch:
+		yield batch
+
+def mappedBlocks(inputFile, lowercase=False, blockSize=1 << 20):
+	"""Read the lines of a UTF-8 file in blocks, through mmap.
+
+	Yields blocks of whole lines, stripped (and lowercased) and joined by
+	newlines, the same lines iterating over the file in text mode and
+	stripping each gives. A block is UTF-8 bytes, which CleaningPipeline
+	cleanText runs its byte stages on before decoding, or a str when it had
+	to be decoded to strip or lowercase (see _inputText).
+
+	Returns None, reading nothing, when inputFile is not a UTF-8 regular
+	file that can be mapped (a pipe, a terminal, an empty file), or on
+	python 2.
+	"""
+	encoding = getattr(inputFile, 'encoding', None) or 'utf-8'
+	if bytes is str or codecs.lookup(encoding).name != 'utf-8':
+		return None
+	try:
+		fileno = inputFile.fileno()
+		if not stat.S_ISREG(os.fstat(fileno).st_mode):
+			return None
+		start = inputFile.tell()
+		data = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+	except (AttributeError, ValueError, EnvironmentError, io.UnsupportedOperation):
+		return None
+	return _mappedBlocks(data, start, lowercase, blockSize)
+
+def _mappedBlocks(data, start, lowercase, blockSize):
+	"""Yield the blocks of mapped data from start, see mappedBlocks."""
+	view = memoryview(data)
+	try:
+		size = len(data)
+		while start < size:
+			end = data.find(b"\n", start + blockSize)
+			end = size if end == -1 else end + 1
+			yield _inputText(view[start:end], lowercase)
+			start = end
+	finally:
+		view.release()
+		data.close()
+
+# the white space str.strip removes from ASCII
+_asciiSpace = b' \t\n\r\x0b\x0c\x1c\x1d\x1e\x1f'
+_carriageReturn = re.compile(b'\r')
+
+def _inputText(block, lowercase):
+	"""Strip (and lowercase) the lines of a block of a UTF-8 file, joined by
+	newlines.
+
+	The text is left UTF-8 bytes, unless str is needed to do what str.strip
+	and str.lower do outside ASCII: it is decoded when lowercasing other
+	characters than ASCII, or when a line ends in white space outside ASCII.
+	"""
+	text = bytes(block)
+	if _carriageReturn.search(block) is not None:
+		# text mode reads a carriage return as a line break
+		text = text.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+	if text[-1:] == b"\n":
+		text = text[:-1]
+	lines = [line.strip(_asciiSpace) for line in text.split(b"\n")]
+	text = b"\n".join(lines)
+	if not text.translate(None, _asciiBytes):
+		return text.lower() if lowercase else text
+	if not lowercase and not _wideEnds(lines):
+		return text
+	text = "\n".join([line.strip() for line in text.decode('utf-8').split("\n")])
+	return text.lower() if lowercase else text
+
+# the first bytes of each compressed format, and the suffix written with it
+_compressions = (('gzip', b'\x1f\x8b', '.gz'), 
+				('bz2', b'BZh', '.bz2'), 
+				('xz', b'\xfd7zXZ\x00', '.xz'), 
+				('zstd', b'\x28\xb5\x2f\xfd', '.zst'))
+
+def compressionOf(path, mode='r'):
+	"""Return the compression of a file: 'gzip', 'bz2', 'xz', 'zstd' or
+	None.
+
+	A file to read ('r') is known by its first bytes, a file to write ('w')
+	by its suffix.
+	"""
+	if mode == 'w':
+		for name, magic, suffix in _compressions:
+			if path.endswith(suffix):
+				return name
+		return None
+	f = open(path, 'rb')
+	try:
+		return _magicCompression(f.read(6))
+	finally:
+		f.close()
+
+def _magicCompression(head):
+	"""Return the compression the first bytes of a file show, or None."""
+	for name, magic, suffix in _compressions:
+		if head.startswith(magic):
+			return name
+	return None
+
+def openText(path, mode='r', bufferSize=1 << 20):
+	"""Open a text file to read ('r') or write ('w'), compressed or not.
+
+	Compressed files (see compressionOf) go through their codec in this
+	process, bufferSize bytes at a time. A file read is decompressed ahead
+	in a background thread (see ReadAhead), so decompression overlaps with
+	cleaning. Other files are opened as open would.
+
+	Raises EnvironmentError when the file can not be opened, and ValueError
+	when its codec is not available (zstd needs the zstandard package).
+	"""
+	if mode == 'w':
+		compression = compressionOf(path, 'w')
+		if compression is None:
+			return open(path, 'w')
+		binary = io.BufferedWriter(_codecFile(path, compression, 'w'), 
+								bufferSize)
+		return io.TextIOWrapper(binary)
+	raw = io.open(path, 'rb', buffering=bufferSize)
+	try:
+		# peek does not take the bytes, which a pipe could not give back
+		compression = _magicCompression(raw.peek(6)[:6])
+		if compression is None:
+			raw.close()
+			return open(path, 'r')
+		binary = ReadAhead(_codecFile(raw, compression, 'r'), bufferSize, 
+						[raw])
+		binary.name = path
+	except Exception:
+		raw.close()
+		raise
+	return io.TextIOWrapper(io.BufferedReader(binary, bufferSize))
+
+def _codecFile(source, compression, mode):
+	"""Open a binary codec file on a path or file object source."""
+	if compression == 'zstd':
+		if _zstandard is None:
+			raise ValueError("reading or writing zstd files needs the "
+							"zstandard package")
+		if mode == 'w':
+			return _zstandard.ZstdCompressor().stream_writer(
+											io.open(source, 'wb'))
+		return _zstandard.ZstdDecompressor().stream_reader(source, 
+															closefd=False)
+	if compression == 'gzip':
+		import gzip
+		if mode == 'w':
+			return gzip.open(source, 'wb')
+		return gzip.GzipFile(fileobj=source)
+	if compression == 'bz2':
+		import bz2
+		return bz2.BZ2File(source, mode)
+	try:
+		import lzma
+	except ImportError: # python 2
+		raise ValueError("reading or writing xz files needs python 3")
+	return lzma.LZMAFile(source, mode)
+
+class CorruptInputError(IOError):
+	"""A compressed input file is truncated or corrupt."""
+
+class ReadAhead(io.RawIOBase):
+	"""Reads a binary file ahead in a background thread.
+
+	The thread keeps up to depth chunks of chunkSize bytes read, so a slow
+	source (a decompressor, which releases the GIL) works while the reader
+	does. Errors of the system are raised to the reader as they are, the
+	others as CorruptInputError, naming the file: the decompressors raise
+	EOFError, zlib.error or their own errors for a truncated or corrupt
+	file.
+
+	public interface:
+	* __init__ -- takes the file to read, the chunk size and depth, and
+		other files to close with it (the file below a codec).
+	* readinto -- the io.RawIOBase read method; wrap in io.BufferedReader.
+	* close -- stop the thread, and close the files.
+
+	Attributes:
+	name - the path of the file, when openText opened it.
+	"""
+
+	name = None
+
+	def __init__(self, source, chunkSize=1 << 20, closing=(), depth=4):
+		"""Get a new ReadAhead instance, and start its thread."""
+		io.RawIOBase.__init__(self)
+		self._source = source
+		self._closing = list(closing)
+		self._chunks = queue.Queue(depth)
+		self._chunk = b''
+		self._offset = 0
+		self._done = False
+		self._stop = threading.Event()
+		self._thread = threading.Thread(target=self._readAll, 
+										args=(chunkSize,))
+		self._thread.daemon = True
+		self._thread.start()
+
+	def _readAll(self, chunkSize):
+		"""Read the source into the queue, in the background thread."""
+		try:
+			while not self._stop.is_set():
+				data = self._source.read(chunkSize)
+				self._put(data)
+				if not data:
+					return
+		except Exception as e:
+			self._put(e)
+
+	def _put(self, item):
+		"""Queue item, unless the reader closes first."""
+		while not self._stop.is_set():
+			try:
+				self._chunks.put(item, timeout=0.1)
+				return
+			except queue.Full:
+				pass
+
+	def readable(self):
+		return True
+
+	def readinto(self, buf):
+		"""Read up to len(buf) bytes into buf, returning the number read (0
+		at the end of the file)."""
+		if self._offset == len(self._chunk):
+			if self._done:
+				return 0
+			chunk = self._chunks.get()
+			if isinstance(chunk, Exception):
+				self._done = True
+				if (isinstance(chunk, EnvironmentError) and 
+						chunk.errno is not None):
+					raise chunk
+				raise CorruptInputError("%s is truncated or corrupt: %s" % 
+							(self.name or 'the compressed input', chunk))
+			if not chunk:
+				self._done = True
+				return 0
+			self._chunk = chunk
+			self._offset = 0
+		size = min(len(buf), len(self._chunk) - self._offset)
+		buf[:size] = self._chunk[self._offset:self._offset + size]
+		self._offset += size
+		return size
+
+	def close(self):
+		"""Stop the thread, and close the source and the other files."""
+		if not self.closed:
+			self._stop.set()
+			self._thread.join()
+			for f in [self._source] + self._closing:
+				f.close()
+		io.RawIOBase.close(self)
+
+def streamTags(removeTags, chunks, maxTagSize=None):
+	"""Apply a tag removing function to a stream of chunks.
+
+	Text from an unclosed '<' onwards is held back until a later chunk closes
+	it, so tags spanning chunks are removed just like in one big string. A
+	'<' with maxTagSize characters after it and no '>' is taken as text
+	(like in HtmlStripper, whose maxTagSize is the default), so a stray one
+	holds back a bounded amount of text.
+	"""
+	if maxTagSize is None:
+		maxTagSize = HtmlStripper.maxTagSize
+	# the held back pieces, joined only when a '>' comes or they get too long
+	pending = []
+	size = 0
+	for chunk in chunks:
+		if pending and '>' not in chunk:
+			pending.append(chunk)
+			size += len(chunk)
+			if size < maxTagSize:
+				continue
+			text = ''.join(pending)
+			start = 0
+		else:
+			text = ''.join(pending) + chunk if pending else chunk
+			start = text.find('<', text.rfind('>') + 1)
+		if start != -1 and len(text) - start >= maxTagSize:
+			# hold back only a '<' that may still start a tag
+			start = text.find('<', max(start, len(text) - maxTagSize + 1))
+		if start == -1:
+			pending = []
+			size = 0
+		else:
+			text, pending = text[:start], [text[start:]]
+			size = len(pending[0])
+		yield removeTags(text)
+	if pending:
+		yield removeTags(''.join(pending))
+
+def streamWholeWords(chunks):
+	"""Re-split a stream of text so that no word straddles two chunks."""
+	tail = ''
+	for chunk in chunks:
+		text = tail + chunk
+		cut = text.rfind(' ') + 1
+		tail = text[cut:]
+		if cut:
+			yield text[:cut]
+	if tail:
+		yield tail
+
+class HtmlStripper:
+	"""Strips html markup from text that is fed to it a piece at a time.
+
+	Tags are removed, the content of script and style elements and of
+	comments is dropped, and character entities are decoded. A tag or
+	element left open at the end of a piece is carried over to the next, so
+	markup may span lines and chunks; only the text that may still turn out
+	to be markup is held back, so memory use does not grow with the input.
+	A tag or element still open at the end of the input is dropped.
+
+	public interface:
+	* __init__ -- optionally turn off entity decoding.
+	* feed -- strip the next piece of text, returning what is ready.
+	* feedLine -- strip the next line. Nothing is held back from the text
+		between tags, and the line breaks of removed markup are kept, so
+		lines joined by line breaks can be stripped in one call and split
+		again.
+	* close -- return the text still held back, and reset.
+	* reset -- forget any markup left open.
+	* strip -- strip a whole document.
+	* getState, setState -- save and restore the markup left open, to go on
+		from there in another process.
+	"""
+
+	# tags longer than this are not held back, their '<' is taken as text
+	maxTagSize = 65536
+
+	_tag = re.compile(r'<[A-Za-z/?!][^>]*>')
+	_lineBreakTag = re.compile(r'<[A-Za-z/?!][^>\n]*\n[^>]*>')
+	_tagStart = re.compile(r'<[A-Za-z/?!]')
+	_tagOrEnd = re.compile(r'<(?:[A-Za-z/?!]|\Z)')
+	_skipStart = re.compile(r'<(?:!--|(script|style)\b[^>]*>)', re.I)
+	_skipEnd = {'': re.compile(r'-->'),
+				'script': re.compile(r'</script\s*>', re.I),
+				'style': re.compile(r'</style\s*>', re.I)}
+	_entity = re.compile(r'&(?:#([0-9]{1,7})|#[xX]([0-9a-fA-F]{1,6})|'
+						r'([A-Za-z][A-Za-z0-9]{1,31}));')
+	_entityStart = re.compile(r'&(?:#[xX]?[0-9a-fA-F]*|[A-Za-z][A-Za-z0-9]*)?\Z')
+
+	def __init__(self, decodeEntities=True):
+		"""Get a new HtmlStripper instance.
+
+		Params:
+		[decodeEntities] - decode character entities (&amp;, &#8212;).
+		"""
+		self.decodeEntities = decodeEntities
+		self.reset()
+
+	def feed(self, text):
+		"""Strip the next piece of text, returning the text that is ready."""
+		return self._strip(text, False)
+
+	def feedLine(self, line):
+		"""Strip the next line (or lines), keeping every line break."""
+		return self._strip(line, True)
+
+	def close(self):
+		"""Return the text still held back and reset.
+
+		Markup left open at the end of the input is dropped.
+		"""
+		pending = self._pending
+		if self._skipping is not None or self._tagStart.match(pending):
+			pending = ''
+		self.reset()
+		return self._decode(pending, False)
+
+	def reset(self):
+		"""Forget any markup left open."""
+		self._pending = ''
+		self._skipping = None
+
+	def strip(self, text):
+		"""Strip a whole document."""
+		self.reset()
+		return self.feed(text) + self.close()
+
+	def getState(self):
+		"""Return the text held back and the element being skipped ('' for
+		a comment, None if none), as a list that can be saved as JSON."""
+		skipping = None
+		for name, end in self._skipEnd.items():
+			if end is self._skipping:
+				skipping = name
+		return [self._pending, skipping]
+
+	def setState(self, state):
+		"""Go on from a state returned by getState."""
+		self._pending, skipping = state
+		self._skipping = self._skipEnd[skipping] if skipping is not None else None
+
+	# private interface
+	def _strip(self, text, lines):
+		"""Strip text following what was held back.
+
+		The end of text that may still be markup is held back, and so is a
+		partial entity unless lines is set. With lines set every line break
+		of text is in the result, and a line break is assumed after text.
+		"""
+		if self._pending:
+			text = self._pending + text
+			self._pending = ''
+		out = []
+		pos = 0
+		while True:
+			if self._skipping is not None:
+				match = self._skipping.search(text, pos)
+				if match is None:
+					# keep what may be the start of the end tag
+					self._holdBack(out, text, pos, 
+								max(pos, len(text) - 32), lines)
+					break
+				self._drop(out, text, pos, match.end(), lines)
+				pos = match.end()
+				self._skipping = None
+			match = self._skipStart.search(text, pos)
+			if match is not None and self._tagStart.search(text, 
+						max(pos, text.rfind('>', pos, match.start()) + 1), 
+						match.start()):
+				# a tag left open before it swallows the start of the element
+				close = text.find('>', match.start())
+				if close != -1:
+					out.append(self._stripTags(text, pos, close + 1, lines))
+					pos = close + 1
+					continue
+				match = None
+			if match is None:
+				cut = self._heldBack(text, pos, lines)
+				out.append(self._stripTags(text, pos, cut, lines))
+				self._holdBack(out, text, cut, cut, lines)
+				break
+			out.append(self._stripTags(text, pos, match.start(), lines))
+			self._skipping = self._skipEnd[(match.group(1) or '').lower()]
+			self._drop(out, text, match.start(), match.end(), lines)
+			pos = match.end()
+		return self._decode(''.join(out), lines)
+
+	def _heldBack(self, text, pos, lines):
+		"""Return where the text that must wait for the next piece starts."""
+		end = len(text)
+		# a line break follows a line, and a tag never starts with one
+		tagStart = self._tagStart if lines else self._tagOrEnd
+		tag = tagStart.search(text, max(pos, text.rfind('>') + 1))
+		if tag is not None and end - tag.start() < self.maxTagSize:
+			return tag.start()
+		if not lines:
+			amp = text.rfind('&', max(pos, end - 40))
+			if amp != -1 and self._entityStart.match(text, amp):
+				return amp
+		return end
+
+	def _holdBack(self, out, text, start, cut, lines):
+		"""Drop text[start:cut] and keep text[cut:] for the next piece.
+
+		With lines set the line breaks of the kept text are given out now,
+		and the text keeps spaces in their place.
+		"""
+		self._drop(out, text, start, cut, lines)
+		pending = text[cut:]
+		if lines and pending:
+			self._drop(out, pending, 0, len(pending), lines)
+			pending = pending.replace('\n', ' ') + ' '
+		self._pending = pending
+
+	def _drop(self, out, text, start, end, lines):
+		"""Drop text[start:end], keeping its line breaks if lines is set."""
+		if lines:
+			breaks = text.count('\n', start, end)
+			if breaks:
+				out.append('\n' * breaks)
+
+	def _stripTags(self, text, start, end, lines):
+		"""Return text[start:end] without its tags."""
+		segment = text[start:end]
+		stripped = self._tag.sub('', segment)
+		if not lines or stripped.count('\n') == segment.count('\n'):
+			return stripped
+		pieces = []
+		last = 0
+		# only the tags spanning lines leave something behind
+		for match in self._lineBreakTag.finditer(segment):
+			pieces.append(self._tag.sub('', segment[last:match.start()]))
+			self._drop(pieces, segment, match.start(), match.end(), lines)
+			last = match.end()
+		pieces.append(self._tag.sub('', segment[last:]))
+		return ''.join(pieces)
+
+	def _decode(self, text, lines):
+		"""Decode the character entities of text."""
+		if not self.decodeEntities or '&' not in text:
+			return text
+		if lines:
+			return self._entity.sub(_entityLineText, text)
+		return self._entity.sub(_entityText, text)
+
+def _entityText(match):
+	"""Return the text of an entity match, or the match if it is unknown."""
+	decimal, hexadecimal, name = match.groups()
+	if name is not None:
+		codepoint = name2codepoint.get(name)
+		if codepoint is None:
+			return match.group(0)
+	else:
+		codepoint = int(decimal) if decimal is not None else int(hexadecimal, 16)
+	if codepoint == 0 or 0xD800 <= codepoint < 0xE000 or codepoint > 0x10FFFF:
+		return match.group(0)
+	try:
+		if bytes is str: # python 2 strings are utf-8 bytes
+			return unichr(codepoint).encode('utf-8')
+		return chr(codepoint)
+	except ValueError: # narrow python 2 builds
+		return match.group(0)
+
+def _entityLineText(match):
+	"""Same as _entityText, but an encoded line break becomes a space."""
+	text = _entityText(match)
+	return ' ' if text == '\n' else text
+
+class CleaningStats:
+	"""Collects timings and counters of a cleaning run, stage by stage.
+
+	Nothing is recorded unless a CleaningStats is handed to a
+	CleaningPipeline, or used to instrument a Remover and PorterStemmer, so
+	it costs nothing when not used.
+
+	public interface:
+	* wrap -- wrap a function taking a string, recording its calls, time,
+		characters and tokens in and out under a stage name.
+	* instrument -- wrap the public methods of a Remover and the stemWords
+		method of a PorterStemmer.
+	* countLookups -- return a stopword/dictionary lookup function that
+		counts lookups and hits.
+	* countFilter -- wrap a function filtering a list of tokens, counting
+		the tokens it looked up and the hits.
+	* watchCache -- report the hits and misses of a StemCache.
+	* watchDeduper -- report the lines a LineDeduper dropped.
+	* take -- return the counters recorded since the last take.
+	* merge -- add counters returned by take (from another process).
+	* summary -- return all counters as a dict.
+	* write -- write the summary as a table or as JSON.
+	"""
+
+	_removerMethods = ('removeStopwords', 'removePunctuation', 
+				'removeNonDictionaryWords', 'removeNumbers', 
+				'removeExtraSpaces', 'removeArticlesFromFront', 'removeTags', 
+				'removeApostrophes', 'removeHtml')
+
+	def __init__(self):
+		"""Get a new, empty CleaningStats instance."""
+		self.started = default_timer()
+		# name -> [calls, seconds, chars in, chars out, tokens in, tokens out]
+		self.stages = OrderedDict()
+		# name -> [lookups, hits]
+		self.lookups = OrderedDict()
+		# [hits, misses] of the watched caches, and the values last taken
+		self.cache = [0, 0]
+		self._caches = []
+		self._dedupers = []
+
+	def wrap(self, name, function):
+		"""Return function wrapped to record its calls under name.
+
+		function takes a string (or UTF-8 bytes, counted as characters) or
+		a list of tokens, and returns a string or a list of words. A None
+		result (a byte stage leaving the text to the str stage) only records
+		the call and its time.
+		"""
+		record = self.stages.setdefault(name, [0, 0.0, 0, 0, 0, 0])
+		timer = default_timer
+		def timed(text):
+			start = timer()
+			result = function(text)
+			record[1] += timer() - start
+			record[0] += 1
+			if result is None:
+				return result
+			if isinstance(text, list):
+				record[2] += sum(len(w) + 1 for w in text) - (1 if text else 0)
+				record[4] += sum(1 for w in text if w.strip() != '')
+			else:
+				record[2] += len(text)
+				record[4] += len(text.split())
+			if isinstance(result, list):
+				record[3] += sum(len(w) + 1 for w in result) - (1 if result else 0)
+				record[5] += len(result)
+			else:
+				record[3] += len(result)
+				record[5] += len(result.split())
+			return result
+		return timed
+
+	def instrument(self, remover=None, stemmer=None):
+		"""Wrap the methods of a Remover and/or a PorterStemmer instance."""
+		if remover is not None:
+			for name in self._removerMethods:
+				setattr(remover, name, self.wrap(name, getattr(remover, name)))
+		if stemmer is not None:
+			stemmer.stemWords = self.wrap('stemWords', stemmer.stemWords)
+			self.watchCache(stemmer.cache)
+
+	def countLookups(self, tests):
+		"""Return a lookup function for tests that counts lookups and hits.
+
+		tests are (name, wanted, words) tuples: a word is kept when its lower
+		case form being in words equals wanted, for every test.
+		"""
+		records = [self.lookups.setdefault(name, [0, 0]) 
+					for name, wanted, words in tests]
+		tests = [(record, wanted, words) 
+				for record, (name, wanted, words) in zip(records, tests)]
+		def lookup(word):
+			lower = word.lower()
+			for record, wanted, words in tests:
+				found = lower in words
+				record[0] += 1
+				if found:
+					record[1] += 1
+				if found != wanted:
+					return None
+			return word
+		return lookup
+
+	def countFilter(self, name, function, wanted=False):
+		"""Return function wrapped to count lookups and hits under name.
+
+		function takes a list of tokens and returns the tokens it keeps, or
+		a tuple of them and the tokens it holds back for the next call. Each
+		other token counts as a lookup, and as a hit when it was removed (or,
+		if wanted, kept); every token of a removed phrase is a hit.
+		"""
+		record = self.lookups.setdefault(name, [0, 0])
+		def counted(tokens, *args):
+			result = function(tokens, *args)
+			kept, rest = result if isinstance(result, tuple) else (result, ())
+			done = len(tokens) - len(rest)
+			record[0] += done
+			record[1] += len(kept) if wanted else done - len(kept)
+			return result
+		return counted
+
+	def watchCache(self, cache):
+		"""Report the hits and misses cache records from now on."""
+		if cache is not None and cache not in [c for c, h, m in self._caches]:
+			self._caches.append([cache, cache.hits, cache.misses])
+
+	def watchDeduper(self, deduper):
+		"""Report the lines deduper checks and drops in the summary."""
+		self._dedupers.append(deduper)
+
+	def take(self):
+		"""Return the counters recorded since the last take, and reset them."""
+		self._readCaches()
+		taken = {'stages': [(n, r[:]) for n, r in self.stages.items()], 
+				'lookups': [(n, r[:]) for n, r in self.lookups.items()], 
+				'cache': self.cache[:]}
+		for record in self.stages.values():
+			record[:] = [0, 0.0, 0, 0, 0, 0]
+		for record in self.lookups.values():
+			record[:] = [0, 0]
+		self.cache = [0, 0]
+		return taken
+
+	def merge(self, taken):
+		"""Add the counters returned by take (in another process)."""
+		for name, values in taken['stages']:
+			record = self.stages.setdefault(name, [0, 0.0, 0, 0, 0, 0])
+			record[:] = [a + b for a, b in zip(record, values)]
+		for name, values in taken['lookups']:
+			record = self.lookups.setdefault(name, [0, 0])
+			record[:] = [a + b for a, b in zip(record, values)]
+		self.cache = [a + b for a, b in zip(self.cache, taken['cache'])]
+
+	def summary(self):
+		"""Return the counters as a dict, ready for JSON."""
+		self._readCaches()
+		stages = []
+		for name, record in self.stages.items():
+			calls, seconds, charsIn, charsOut, tokensIn, tokensOut = record
+			stages.append({'stage': name, 'calls': calls, 
+							'seconds': round(seconds, 6), 
+							'chars_in': charsIn, 'chars_out': charsOut, 
+							'tokens_in': tokensIn, 'tokens_out': tokensOut})
+		lookups = {}
+		for name, (count, hits) in self.lookups.items():
+			lookups[name] = {'lookups': count, 'hits': hits, 
+						'hit_rate': round(float(hits) / count, 4) if count else None}
+		hits, misses = self.cache
+		summary = {'seconds': round(default_timer() - self.started, 6), 
+				'stages': stages, 
+				'lookups': lookups, 
+				'stem_cache': {'hits': hits, 'misses': misses, 
+					'hit_rate': (round(float(hits) / (hits + misses), 4) 
+								if hits + misses else None)}}
+		if self._dedupers:
+			summary['dedupe'] = dict((name, sum(getattr(d, name) for d in 
+												self._dedupers)) 
+									for name in ('lines', 'exact', 'near', 
+												'skipped'))
+		return summary
+
+	def write(self, out, asJson=False):
+		"""Write the summary to out, as a table or as JSON."""
+		summary = self.summary()
+		if asJson:
+			json.dump(summary, out, indent=1, sort_keys=True)
+			out.write("\n")
+			return
+		out.write("%-28s %8s %10s %12s %12s %11s %11s\n" % ('stage', 'calls', 
+					'seconds', 'chars in', 'chars out', 'tokens in', 
+					'tokens out'))
+		for stage in summary['stages']:
+			if stage['calls'] == 0:
+				# never ran, like a str stage its byte stage did all of
+				continue
+			out.write("%-28s %8d %10.4f %12d %12d %11d %11d\n" % (
+						stage['stage'], stage['calls'], stage['seconds'], 
+						stage['chars_in'], stage['chars_out'], 
+						stage['tokens_in'], stage['tokens_out']))
+		for name, lookup in sorted(summary['lookups'].items()):
+			out.write("%s: %d lookups, %d hits\n" % (name, lookup['lookups'], 
+						lookup['hits']))
+		cache = summary['stem_cache']
+		if cache['hits'] or cache['misses']:
+			out.write("stem cache: %d hits, %d misses\n" % (cache['hits'], 
+						cache['misses']))
+		if 'dedupe' in summary:
+			dedupe = summary['dedupe']
+			out.write("dedupe: %d lines, %d exact and %d near duplicates "
+						"dropped, %d raw lines skipped\n" % (dedupe['lines'], 
+						dedupe['exact'], dedupe['near'], dedupe['skipped']))
+		out.write("total: %.4f seconds\n" % summary['seconds'])
+
+	# private interface
+	def _readCaches(self):
+		"""Add what the watched caches recorded since they were last read."""
+		for watched in self._caches:
+			cache, hits, misses = watched
+			self.cache[0] += cache.hits - hits
+			self.cache[1] += cache.misses - misses
+			watched[1:] = [cache.hits, cache.misses]
+
+class WordCounter:
+	"""Counts words, exactly or approximately in a fixed amount of memory.
+
+	With a capacity the counter keeps the 'space-saving' summary of the
+	heavy hitters: at most 2 * capacity words are counted at a time, and
+	when that is exceeded only the capacity most frequent words are kept.
+	A word counted for the first time after that may have been seen before,
+	so it starts at the largest count dropped so far (its possible error).
+	Counts are never too low, and are too high by at most their error.
+
+	public interface:
+	* __init__ -- takes the capacity, 0 (the default) counts exactly.
+	* add -- count a list of words.
+	* state -- return the counts in a form that can be sent to another
+		process, for merge.
+	* merge -- add the counts of another WordCounter (see state).
+	* items -- return (word, count, error) tuples, most frequent first.
+	* write -- write the counts as TSV or JSON.
+	"""
+
+	def __init__(self, capacity=0):
+		"""Get a new WordCounter instance.
+
+		Params:
+		[capacity] - number of words kept by the approximate counter, 0 to
+				count exactly.
+		"""
+		self.capacity = capacity
+		self.counts = defaultdict(int)
+		self.errors = {}
+		self.floor = 0
+		self.total = 0
+
+	def add(self, words):
+		"""Count a list of words."""
+		self.total += len(words)
+		counts = self.counts
+		if not self.capacity:
+			for word in words:
+				counts[word] += 1
+			return
+		for word in words:
+			if word in counts:
+				counts[word] += 1
+				continue
+			counts[word] = self.floor + 1
+			if self.floor:
+				self.errors[word] = self.floor
+			if len(counts) > 2 * self.capacity:
+				self._prune()
+				counts = self.counts
+
+	def state(self):
+		"""Return the counts, errors, floor and total as plain values."""
+		return (dict(self.counts), self.errors, self.floor, self.total)
+
+	def merge(self, state):
+		"""Add the counts of another WordCounter, as returned by its state.
+
+		A word one summary does not have counts as that summary's floor, the
+		most it can have been seen there.
+		"""
+		counts, errors, floor, total = state
+		self.total += total
+		if not self.capacity:
+			for word, count in counts.items():
+				self.counts[word] += count
+			return
+		merged = defaultdict(int)
+		mergedErrors = {}
+		for word in set(self.counts) | set(counts):
+			merged[word] = (self.counts.get(word, self.floor) + 
+							counts.get(word, floor))
+			error = (self.errors.get(word, 0 if word in self.counts else 
+											self.floor) + 
+					errors.get(word, 0 if word in counts else floor))
+			if error:
+				mergedErrors[word] = error
+		self.counts = merged
+		self.errors = mergedErrors
+		self.floor += floor
+		if len(merged) > 2 * self.capacity:
+			self._prune()
+
+	def items(self, top=0):
+		"""Return (word, count, error) tuples, most frequent first.
+
+		Words with the same count are in alphabetical order. With top only
+		that many words are returned.
+		"""
+		ranked = sorted(self.counts.items(), key=operator.itemgetter(0))
+		ranked.sort(key=operator.itemgetter(1), reverse=True)
+		if top:
+			ranked = ranked[:top]
+		return [(word, count, self.errors.get(word, 0)) 
+				for word, count in ranked]
+
+	def write(self, out, top=0, asJson=False, counts=True):
+		"""Write the words, most frequent first, as TSV or JSON.
+
+		TSV lines hold the word, its count and, when counting approximately,
+		its error. Without counts only the words are written.
+		"""
+		items = self.items(top)
+		if asJson:
+			if not counts:
+				words = [word for word, count, error in items]
+			elif self.capacity:
+				words = [list(item) for item in items]
+			else:
+				words = [[word, count] for word, count, error in items]
+			json.dump({'tokens': self.total, 'types': len(self.counts), 
+						'approximate': bool(self.capacity), 'words': words}, 
+						out, indent=1, sort_keys=True)
+			out.write("\n")
+			return
+		for word, count, error in items:
+			if not counts:
+				out.write(word + "\n")
+			elif self.capacity:
+				out.write("%s\t%d\t%d\n" % (word, count, error))
+			else:
+				out.write("%s\t%d\n" % (word, count))
+
+	# private interface
+	def _prune(self):
+		"""Keep the capacity most frequent words."""
+		ranked = sorted(self.counts.items(), key=operator.itemgetter(1), 
+						reverse=True)
+		self.floor = max(self.floor, ranked[self.capacity][1])
+		self.counts = defaultdict(int, ranked[:self.capacity])
+		self.errors = dict((word, self.errors[word]) for word in self.counts 
+							if word in self.errors)
+
+def _byteCounterTable():
+	"""Return the table turning a byte into a 32 bit counter for each of its
+	set bits, bit 0 lowest (built here, as a python 2 class body can not
+	be seen from a generator inside it)."""
+	table = []
+	for b in range(256):
+		table.append(sum(1 << (32 * bit) for bit in range(8) if b >> bit & 1))
+	return table
+
+class LineDeduper:
+	"""Drops cleaned lines already seen, and optionally near duplicates.
+
+	Exact duplicates are found by a 64 bit hash of the line, kept in a
+	_HashSet of at most half of maxBytes. When that is full new lines are
+	no longer remembered, though they are still checked against the lines
+	that are: a duplicate may be missed, but a line is never dropped
+	wrongly (short of a 64 bit hash collision).
+
+	With distance set, a line whose SimHash (a 64 bit fingerprint of its
+	character 4-grams) differs in at most distance bits from the one of a
+	line kept is dropped too. The fingerprints are indexed by distance + 1
+	bands of their bits, as two that close have at least one band in
+	common. The index takes a quarter of maxBytes, after which new lines
+	are not indexed.
+
+	dedupe also remembers the raw lines whose cleaned line it has seen, in
+	the last quarter of maxBytes, so a raw line that comes again is dropped
+	without being cleaned. That has to be turned off (raw=False) when the
+	cleaning of a line depends on the lines before it ('html').
+
+	Empty lines are never dropped.
+
+	public interface:
+	* __init__ -- takes the memory cap, the near duplicate distance (0 for
+		exact duplicates only) and whether to skip raw lines already seen.
+	* dedupe -- clean lines with a function, yielding the lines kept.
+	* seen -- check one cleaned line, remembering it.
+
+	Attributes:
+	lines - number of (non-empty) cleaned lines checked.
+	exact - number of lines dropped as exact duplicates.
+	near - number of lines dropped as near duplicates.
+	skipped - number of repeated raw lines, which were not cleaned again.
+	"""
+
+	# bytes a fingerprint takes in the band index, roughly
+	_fingerprintBytes = 256
+	# 4-grams whose SimHash counters are kept, and the table turning a byte
+	# of a hash into a counter (32 bits wide) for each of its bits
+	_maxGrams = 1 << 14
+	_byteCounters = _byteCounterTable()
+
+	def __init__(self, maxBytes=64 << 20, distance=0, raw=True):
+		"""Get a new LineDeduper instance.
+
+		Params:
+		[maxBytes] - memory for the hash tables, in bytes.
+		[distance] - number of SimHash bits a near duplicate may differ in,
+				0 to only drop exact duplicates.
+		[raw] - whether dedupe drops raw lines already seen unclean.
+		"""
+		if not 0 <= distance < 32:
+			raise ValueError("the near duplicate distance must be from 0 "
+							"to 31 bits")
+		self.distance = distance
+		self.raw = raw
+		self.lines = 0
+		self.exact = 0
+		self.near = 0
+		self.skipped = 0
+		self._cleaned = _HashSet(maxBytes // 2)
+		self._raw = _HashSet(maxBytes // 4 if raw else 0)
+		self._fingerprints = 0
+		self._maxFingerprints = maxBytes // 4 // self._fingerprintBytes
+		self._grams = {}
+		# (shift, mask, index) of each band
+		self._bands = []
+		if distance:
+			width = 64 // (distance + 1)
+			for band in range(distance + 1):
+				bits = width if band < distance else 64 - distance * width
+				self._bands.append((band * width, (1 << bits) - 1, {}))
+
+	def dedupe(self, lines, clean):
+		"""Clean lines with clean, yielding the cleaned lines kept.
+
+		clean takes an iterable of lines and yields one cleaned line for each
+		of them, in order (like CleaningPipeline cleanLines). A raw line that
+		is the same as one before it is not sent to clean: it gives what its
+		first occurrence was cleaned to, once that is known.
+		"""
+		# [cleaned line, raw key] of each line in order, and whether it was
+		# sent to clean; the cleaned line of a repeated one is None when it
+		# is known to be a duplicate
+		order = deque()
+		pending = {}
+		def fresh():
+			for line in lines:
+				key = _hash64(line)
+				if self.raw:
+					cell = pending.get(key)
+					if cell is None and self._raw.find(key):
+						cell = [None, key]
+					if cell is not None:
+						order.append((cell, False))
+						continue
+				cell = [None, key]
+				if self.raw:
+					pending[key] = cell
+				order.append((cell, True))
+				yield line
+		def repeated():
+			while order and not order[0][1]:
+				line = order.popleft()[0][0]
+				self.skipped += 1
+				if line is None or (line and 
+									self._cleaned.find(_hash64(line))):
+					continue
+				if not line or not self.seen(line):
+					yield line
+		for line in clean(fresh()):
+			for kept in repeated():
+				yield kept
+			cell = order.popleft()[0]
+			cell[0] = line
+			if self.raw:
+				del pending[cell[1]]
+			if not line or not self.seen(line):
+				yield line
+			if self.raw and line and not self._cleaned.full:
+				# the cleaned line is remembered, so the raw one can be
+				self._raw.add(cell[1])
+		for kept in repeated():
+			yield kept
+
+	def seen(self, line):
+		"""Return True if line is a duplicate (or near duplicate) of a line
+		seen before, else remember it. Empty lines are never duplicates."""
+		if not line:
+			return False
+		self.lines += 1
+		if self._cleaned.add(_hash64(line)):
+			self.exact += 1
+			return True
+		if self.distance and self._nearSeen(line):
+			self.near += 1
+			return True
+		return False
+
+	# private interface
+	def _nearSeen(self, line):
+		"""Return True if a kept line has a fingerprint close to the one of
+		line, else index it."""
+		fingerprint = self._simHash([line[i:i + 4] for i in 
+									range(max(len(line) - 3, 1))])
+		distance = self.distance
+		for shift, mask, index in self._bands:
+			for other in index.get(fingerprint >> shift & mask, ()):
+				if bin(fingerprint ^ other).count('1') <= distance:
+					return True
+		if self._fingerprints < self._maxFingerprints:
+			self._fingerprints += 1
+			for shift, mask, index in self._bands:
+				index.setdefault(fingerprint >> shift & mask, []).append(
+																fingerprint)
+		return False
+
+	def _simHash(self, grams):
+		"""Return the SimHash of a list of strings: bit i is set when more
+		than half of them have bit i set in their hash."""
+		total = 0
+		known = self._grams
+		table = self._byteCounters
+		for gram in grams:
+			counters = known.get(gram)
+			if counters is None:
+				h = _hash64(gram)
+				counters = 0
+				for byte in range(8):
+					counters |= table[h >> (8 * byte) & 255] << (256 * byte)
+				if len(known) < self._maxGrams:
+					known[gram] = counters
+			total += counters
+		# 64 counters of 32 bits, the one of bit 63 first
+		counts = struct.unpack('>64I', binascii.unhexlify('%0512x' % total))
+		count = len(grams)
+		return int(''.join(['1' if 2 * c > count else '0' for c in counts]), 2)
+
+def _hash64(text):
+	"""Return a 64 bit hash of a string, never 0."""
+	return struct.unpack('<Q', hashlib.sha1(_utf8(text)).digest()[:8])[0] or 1
+
+# typecode of the _HashSet slots: 'Q' is python 3 only, python 2 has 'L',
+# which is 8 bytes on 64 bit unix (else hashes are cut to its size)
+try:
+	array.array('Q')
+	_slotCode = 'Q'
+except ValueError: # python 2
+	_slotCode = 'L'
+
+class _HashSet:
+	"""A set of 64 bit hashes (not 0), in an open addressing table of 8 byte
+	slots that doubles as it fills, up to maxBytes. When the table can not
+	take more, add no longer adds, and full is set."""
+
+	def __init__(self, maxBytes):
+		self.full = False
+		self._count = 0
+		self._maxSlots = 1 << max(int(maxBytes // 8).bit_length() - 1, 0)
+		self._slots = array.array(_slotCode, [0]) * min(self._maxSlots, 4096)
+		self._mask = len(self._slots) - 1
+		self._hashMask = (1 << 8 * self._slots.itemsize) - 1
+
+	def find(self, h):
+		"""Return True if h is in the set."""
+		h = h & self._hashMask or 1
+		slots = self._slots
+		mask = self._mask
+		i = h & mask
+		while slots[i]:
+			if slots[i] == h:
+				return True
+			i = (i + 1) & mask
+		return False
+
+	def add(self, h):
+		"""Add h, returning True if it was in the set already."""
+		h = h & self._hashMask or 1
+		slots = self._slots
+		mask = self._mask
+		i = h & mask
+		while slots[i]:
+			if slots[i] == h:
+				return True
+			i = (i + 1) & mask
+		if (self._count + 1) * 2 > len(slots):
+			if len(slots) >= self._maxSlots:
+				# probing would slow down past a load of 3/4
+				if (self._count + 1) * 4 > len(slots) * 3:
+					self.full = True
+					return False
+			else:
+				self._grow()
+				return self.add(h)
+		slots[i] = h
+		self._count += 1
+		return False
+
+	def _grow(self):
+		"""Double the table."""
+		old = self._slots
+		self._slots = array.array(_slotCode, [0]) * (2 * len(old))
+		self._mask = len(self._slots) - 1
+		self._count = 0
+		for h in old:
+			if h:
+				self.add(h)
+
+class CleaningPipeline:
+	"""Runs an ordered list of cleaning operations as one fused plan.
+
+	Operations are named like the command line options: 'html', 'articles',
+	'numbers', 'apostrophes', 'tags', 'punctuation', 'stopwords', 'words',
+	'spaces' and 'stem'. 'html' keeps its state (markup left open) from one
+	line to the next, also across cleanLine and cleanBatch calls; cleanLines
+	and cleanWords start from a clean state. When the plan is built, apostrophe and tag removal
+	are merged into a single regex wherever that can not change the result,
+	and runs of word level operations ('stopwords', 'words', 'spaces',
+	'stem') share one tokenize loop. Numbers and punctuation keep their own
+	passes, as they mostly run through translation tables.
+
+	A string is split into tokens once, by the Remover's tokenizer at the
+	first word level stage (in word mode, also for the output), and the
+	list of tokens is handed from one word level stage to the next (a
+	stopword stage of its own, when there are phrases, and the tokenize
+	loop). It is only joined into a string again for a stage working on
+	text, or for the output.
+
+	public interface:
+	* __init__ -- takes the ordered operations and optionally the Remover and
+		PorterStemmer to use.
+	* cleanLine -- run the plan on a string.
+	* cleanLines -- run the plan on each string of an iterable, yielding the
+		cleaned strings.
+	* cleanBatch -- run the plan on a list of strings, returning a list.
+		Regex stages run once per batch instead of once per string.
+	* cleanText -- same as cleanBatch, on the strings joined by newlines.
+		The text may be given as UTF-8 bytes, which go through the number,
+		tag, apostrophe and punctuation stages without being decoded.
+	* cleanBlocks -- run cleanText on the blocks of mappedBlocks, yielding
+		the cleaned lines.
+	* takesBytes -- whether the plan starts with stages run on bytes.
+	* cleanWords -- run the plan on an iterable of lines treated as one space
+		joined string (word mode), yielding lists of words as they are ready.
+	"""
+
+	OPERATIONS = ('html', 'articles', 'numbers', 'apostrophes', 'tags', 
+					'punctuation', 'stopwords', 'words', 'spaces', 'stem')
+
+	_removals = ('apostrophes', 'tags')
+	_wordOperations = ('stopwords', 'words', 'spaces', 'stem')
+	# stages taking and returning a list of tokens, not a string
+	_tokenKinds = ('tokens', 'phrases')
+
+	def __init__(self, operations, remover=None, stemmer=None, stats=None):
+		"""Get a new CleaningPipeline instance.
+
+		Params:
+		operations - ordered list of operation names to run.
+		[remover] - Remover to use, a default one is made if not given.
+		[stemmer] - PorterStemmer to use, a default one is made if not given.
+		[stats] - CleaningStats to record each stage in. Without it the
+				stages run unwrapped.
+		"""
+		for operation in operations:
+			if operation not in self.OPERATIONS:
+				raise ValueError("unknown operation '%s'" % operation)
+		self.operations = list(operations)
+		self._remover = remover if remover is not None else Remover()
+		self._stemmer = stemmer if stemmer is not None else PorterStemmer()
+		self._stats = stats
+		self._tokenize = self._remover.tokenizer.tokens
+		if stats is not None:
+			stats.watchCache(self._stemmer.cache)
+		self._strippers = []
+		self._stages = self._plan(self.operations)
+
+	def cleanLine(self, line):
+		"""Run the plan on a string."""
+		tokens = None
+		for kind, function in self._stages:
+			if kind in self._tokenKinds:
+				tokens = function(self._tokenize(line) if tokens is None 
+								else tokens)
+				continue
+			if tokens is not None:
+				line = " ".join(tokens)
+				tokens = None
+			line = function(line)
+		return line if tokens is None else " ".join(tokens)
+
+	def cleanLines(self, lines, batchSize=1024):
+		"""Run the plan on each line, yielding the cleaned lines.
+
+		Lines are cleaned a batch of batchSize lines at a time.
+		"""
+		for stripper in self._strippers:
+			stripper.reset()
+		for batch in batchLines(lines, batchSize):
+			for line in self.cleanBatch(batch):
+				yield line
+
+	def takesBytes(self):
+		"""Return True if the plan starts with stages that run on UTF-8
+		bytes, so cleanText and cleanBlocks save decoding."""
+		return self._byteStages[:1] not in ([], [None])
+
+	def cleanBlocks(self, blocks):
+		"""Run the plan on blocks of lines read by mappedBlocks, yielding the
+		cleaned lines."""
+		for stripper in self._strippers:
+			stripper.reset()
+		for text in blocks:
+			for line in self.cleanText(text):
+				yield line
+
+	def cleanBatch(self, lines):
+		"""Run the plan on a list of lines, returning the cleaned lines."""
+		return self._cleanBatch(lines, self._stages)
+
+	def cleanText(self, text):
+		"""Run the plan on lines joined by newlines, returning the cleaned
+		lines.
+
+		text is a str, or UTF-8 bytes. Bytes go through the leading stages
+		that can work on them, one call over the whole text, and are only
+		decoded for the first stage that can not.
+		"""
+		start = 0
+		if isinstance(text, bytes):
+			for function in self._byteStages:
+				if function is None:
+					break
+				cleaned = function(text)
+				if cleaned is None or cleaned.count(b"\n") != text.count(b"\n"):
+					# the stage needs str, or touched a line break
+					break
+				text = cleaned
+				start += 1
+			text = text.decode('utf-8')
+		return self._cleanBatch(text.split("\n"), self._stages[start:])
+
+	def _cleanBatch(self, lines, stages):
+		"""Run stages on a list of lines, see cleanBatch."""
+		tokens = None
+		for kind, function in stages:
+			if kind in self._tokenKinds:
+				if tokens is None:
+					tokens = [self._tokenize(line) for line in lines]
+				tokens = [function(words) for words in tokens]
+				continue
+			if tokens is not None:
+				lines = [" ".join(words) for words in tokens]
+				tokens = None
+			if kind == 'text' or kind == 'tags':
+				lines = self._remover._doBatch(lines, function)
+			elif kind == 'html' and lines:
+				# line breaks are kept, so the lines split apart again
+				lines = function("\n".join(lines)).split("\n")
+			else:
+				lines = [function(line) for line in lines]
+		if tokens is not None:
+			return [" ".join(words) for words in tokens]
+		return list(lines)
+
+	def cleanWords(self, lines):
+		"""Run the plan in word mode, yielding lists of non-empty words.
+
+		The lines are treated as one space joined string, but are processed a
+		chunk at a time so memory use does not grow with the input. Articles
+		are only removed from the front of the whole stream, so only 'html'
+		can come before 'articles' in word mode.
+		"""
+		if 'articles' in [o for o in self.operations if o != 'html'][1:]:
+			raise ValueError("only 'html' can come before 'articles' in "
+							"word mode")
+		for stripper in self._strippers:
+			stripper.reset()
+		chunks = chunkLines(lines)
+		# whether chunks are lists of tokens (else strings)
+		tokens = False
+		last = len(self._stages) - 1
+		for index, (kind, function) in enumerate(self._stages):
+			if kind in self._tokenKinds and not tokens:
+				chunks = (self._tokenize(chunk) for chunk in chunks)
+				tokens = True
+			elif kind not in self._tokenKinds and tokens:
+				# the joining space keeps the words of two chunks apart
+				chunks = (" ".join(chunk) + ' ' for chunk in chunks)
+				tokens = False
+			if kind == 'tokens' and index == last:
+				return self._finalWords(function, chunks)
+			chunks = self._wordModeStage(kind, function, chunks)
+		if not tokens:
+			chunks = (self._tokenize(chunk) for chunk in chunks)
+		return self._finalWords(None, chunks)
+
+	# private interface
+	def _plan(self, operations):
+		"""Group operations into a list of (kind, function) stages."""
+		groups = []
+		# phrases span words, so stopwords can not be a step of a word loop
+		wordOperations = [o for o in self._wordOperations if o != 'stopwords'
+							or not self._remover._phrases]
+		for operation in operations:
+			previous = groups[-1] if groups else None
+			if (operation in self._removals and previous is not None and
+					previous[0] in self._removals and
+					operation != 'apostrophes'):
+				# apostrophes look at their neighbours, so they only see the
+				# right text when no earlier removal was merged with them
+				previous.append(operation)
+			elif (operation in wordOperations and previous is not None
+					and previous[0] in wordOperations and
+					(operation != 'spaces' or 'spaces' not in previous)):
+				previous.append(operation)
+			else:
+				groups.append([operation])
+
+		stages = []
+		# the same stages on UTF-8 bytes, None from the first that can not
+		self._byteStages = []
+		for group in groups:
+			byteFunction = None
+			if bytes is not str and None not in self._byteStages:
+				byteFunction = self._remover._byteFunction(group)
+			if byteFunction is not None and self._stats is not None:
+				# their characters are bytes, so they get a row of their own
+				byteFunction = self._stats.wrap("+".join(group) + " (bytes)", 
+												byteFunction)
+			if group[0] in wordOperations and group != ['spaces']:
+				kind, function = 'tokens', self._wordStage(group)
+			elif group[0] in self._removals and len(group) > 1:
+				pattern = re.compile("|".join(
+									self._remover._removalPattern(o) 
+									for o in group))
+				kind = 'tags' if 'tags' in group else 'text'
+				function = lambda w, p=pattern: p.sub('', w)
+			else:
+				kind, function = self._singleStage(group[0])
+			if self._stats is not None:
+				function = self._stats.wrap("+".join(group), function)
+			stages.append((kind, function))
+			self._byteStages.append(byteFunction)
+		return stages
+
+	def _singleStage(self, operation):
+		"""Return the stage for an operation that is not merged."""
+		remover = self._remover
+		if operation == 'html':
+			self._strippers.append(HtmlStripper())
+			return ('html', self._strippers[-1].feedLine)
+		if operation == 'articles':
+			return ('front', remover.removeArticlesFromFront)
+		if operation == 'numbers':
+			return ('chars', remover.removeNumbers)
+		if operation == 'apostrophes':
+			return ('text', remover.removeApostrophes)
+		if operation == 'tags':
+			return ('tags', remover.removeTags)
+		if operation == 'punctuation':
+			return ('chars', remover.removePunctuation)
+		if operation == 'stopwords':
+			stopwordTokens = self._stopwordTokens()
+			return ('phrases', lambda tokens: stopwordTokens(tokens)[0])
+		return ('spaces', remover.removeExtraSpaces)
+
+	def _wordStage(self, operations):
+		"""Build a function running word operations in one tokenize loop.
+
+		The function takes a list of tokens (a string split by the tokenizer)
+		and returns the list of words left, the same words the Remover and
+		PorterStemmer methods would leave when run one after another.
+		"""
+		if 'stem' not in operations and 'spaces' not in operations:
+			return self._filterStage(operations)
+		if 'spaces' in operations:
+			split = operations.index('spaces')
+			before = self._wordSteps(operations[:split])
+			after = self._wordSteps(operations[split + 1:])
+		else:
+			before = self._wordSteps(operations)
+			after = None
+
+		def clean(tokens):
+			rtnWords = []
+			for word in tokens:
+				word = word.strip()
+				for step in before:
+					word = step(word)
+					if word is None:
+						break
+				else:
+					if after is None:
+						rtnWords.append(word)
+						continue
+					for piece in word.split():
+						for step in after:
+							piece = step(piece)
+							if piece is None:
+								break
+						else:
+							rtnWords.append(piece)
+			return rtnWords
+		return clean
+
+	def _filterStage(self, operations):
+		"""Build a function running stopword and dictionary lookups only,
+		one _filterWords call for each."""
+		filters = []
+		for operation in operations:
+			if operation == 'stopwords':
+				name, words, wanted = 'stopwords', self._remover._stopwords, False
+			else:
+				name, words, wanted = 'dictionary', self._remover._dictionary, True
+			function = (lambda tokens, words=words, wanted=wanted: 
+						_filterWords(tokens, words, wanted))
+			if self._stats is not None:
+				function = self._stats.countFilter(name, function, wanted)
+			filters.append(function)
+		def clean(tokens):
+			for function in filters:
+				tokens = function(tokens)
+			return tokens
+		return clean
+
+	def _stopwordTokens(self):
+		"""Return the Remover's _stopwordTokens, counting its lookups when
+		stats are recorded."""
+		if self._stats is not None:
+			return self._stats.countFilter('stopwords', 
+										self._remover._stopwordTokens)
+		return self._remover._stopwordTokens
+
+	def _wordSteps(self, operations):
+		"""Turn word operations into functions returning a word or None."""
+		steps = []
+		tests = []
+		for operation in operations:
+			# consecutive lookups share one lower() call
+			if operation == 'stopwords':
+				tests.append(('stopwords', False, self._remover._stopwords))
+			elif operation == 'words':
+				tests.append(('dictionary', True, self._remover._dictionary))
+			else:
+				if tests:
+					steps.append(self._lookupStep(tests))
+					tests = []
+				steps.append(self._stemmer.stemWord)
+		if tests:
+			steps.append(self._lookupStep(tests))
+		return steps
+
+	def _lookupStep(self, tests):
+		"""Return a function keeping a word only if it passes every test."""
+		if self._stats is not None:
+			return self._stats.countLookups(tests)
+		def lookup(word):
+			lower = word.lower()
+			for name, wanted, words in tests:
+				if (lower in words) != wanted:
+					return None
+			return word
+		return lookup
+
+	def _wordModeStage(self, kind, function, chunks):
+		"""Apply a stage to a stream of chunks, keeping words apart."""
+		if kind == 'front':
+			return _firstChunk(function, chunks)
+		if kind == 'tags':
+			return streamWholeWords(streamTags(function, chunks))
+		if kind == 'html':
+			# markup held back may split a word between chunks
+			return streamWholeWords(function(chunk) for chunk in chunks)
+		if kind == 'spaces':
+			# the function strips, put back the space ending the chunk
+			return (function(chunk) + ' ' for chunk in chunks)
+		if kind == 'phrases':
+			return self._streamPhrases(chunks)
+		return (function(chunk) for chunk in chunks)
+
+	def _streamPhrases(self, chunks):
+		"""Remove stopwords and phrases from a stream of token lists.
+
+		The tokens a phrase may still go on from are carried over to the
+		next list.
+		"""
+		stopwordTokens = self._stopwordTokens()
+		def clean(tokens):
+			kept, rest[:] = stopwordTokens(rest + tokens, False)
+			return kept
+		if self._stats is not None:
+			clean = self._stats.wrap('stopwords', clean)
+		rest = []
+		for chunk in chunks:
+			yield clean(chunk)
+		if rest:
+			yield stopwordTokens(rest)[0]
+
+	def _finalWords(self, function, chunks):
+		"""Yield the non-empty words of each list of tokens."""
+		for chunk in chunks:
+			if function is not None:
+				words = [w for w in function(chunk) if w != '']
+			else:
+				words = [w.strip() for w in chunk if w.strip() != '']
+			if words:
+				yield words
+
+def _firstChunk(function, chunks):
+	"""Apply function to the first chunk only (used for articles)."""
+	first = True
+	for chunk in chunks:
+		if first:
+			first = False
+			# keep the joining space that removeArticlesFromFront strips
+			chunk = function(chunk) + ' '
+		yield chunk
+
+def loadRemover(removerFiles, profile=''):
+	"""Return a Remover made from removerFiles (the filenames, in the order
+	Remover.__init__ takes them, optionally followed by the tokenizer).
+
+	If a profile filename is given it is used as a cache: the Remover is
+	loaded from it when it is up to date, otherwise it is built from the
+	files and the profile is saved again.
+	"""
+	if profile == '':
+		return Remover(*removerFiles)
+	cleaner = Remover.loadProfile(profile, *removerFiles)
+	if cleaner is None:
+		cleaner = Remover(*removerFiles)
+		cleaner.saveProfile(profile)
+	return cleaner
+
+# state of a cleanParallel worker process, built once by _initWorker
+_worker = {}
+
+def _initWorker(operations, removerFiles, profile, stemCacheSize, 
+				stemCacheFile, withStats=False, countCapacity=None, 
+				outputArgs=None):
+	"""Build the Remover, PorterStemmer and pipelines of a worker process.
+
+	outputArgs are the command line args _inputLines and _writeOutput need,
+	for cleanFiles.
+	"""
+	cleaner = loadRemover(removerFiles, profile)
+	stemCache = StemCache(stemCacheSize) if stemCacheSize > 0 else False
+	if (stemCache is not False and stemCacheFile != '' and 
+			os.path.exists(stemCacheFile)):
+		stemCache.load(stemCacheFile)
+	stemmer = PorterStemmer(stemCache, cleaner.tokenizer)
+	stats = _worker['stats'] = CleaningStats() if withStats else None
+	_worker['count'] = countCapacity
+	_worker['args'] = outputArgs
+	_worker['first'] = CleaningPipeline(operations, cleaner, stemmer, stats)
+	_worker['rest'] = CleaningPipeline(
+						[o for o in operations if o != 'articles'], 
+						cleaner, stemmer, stats)
+
+def _cleanChunk(task):
+	"""Clean one chunk of lines in a worker process.
+
+	Returns the result and the stats counters recorded for it, if any.
+	When counting, the result is the state of a WordCounter.
+	"""
+	lines, wordMode, first, more = task
+	if not wordMode:
+		result = _worker['first'].cleanBatch(lines)
+	else:
+		if first and more:
+			# an article ending the first chunk is still followed by a space
+			lines.append('')
+		pipeline = _worker['first'] if first else _worker['rest']
+		result = [w for words in pipeline.cleanWords(lines) for w in words]
+	if _worker['count'] is not None:
+		counter = WordCounter(_worker['count'])
+		if wordMode:
+			counter.add(result)
+		else:
+			for line in result:
+				counter.add(line.split())
+		result = counter.state()
+	stats = _worker['stats']
+	return result, stats.take() if stats is not None else None
+
+def _parallelChunks(lines, chunkSize, wholeTags, maxTagSize=None):
+	"""Group lines into lists of about chunkSize characters.
+
+	Yields (chunk, more) pairs, more being False for the last chunk. With
+	wholeTags set a chunk never ends inside an unclosed tag, unless the tag
+	has gone on for maxTagSize characters (HtmlStripper.maxTagSize by
+	default), when its '<' is taken as text, as streamTags does.
+	"""
+	if maxTagSize is None:
+		maxTagSize = HtmlStripper.maxTagSize
+	chunk = []
+	size = 0
+	# the characters from the last unclosed '<', None when there is none
+	tagSize = None
+	previous = None
+	for line in lines:
+		chunk.append(line)
+		size += len(line) + 1
+		if wholeTags:
+			close = line.rfind('>')
+			start = line.rfind('<')
+			if start > close:
+				tagSize = len(line) - start
+			elif close != -1:
+				tagSize = None
+			elif tagSize is not None:
+				tagSize += len(line) + 1
+		if size >= chunkSize and (tagSize is None or tagSize >= maxTagSize):
+			if previous is not None:
+				yield previous, True
+			previous = chunk
+			chunk = []
+			size = 0
+	if chunk:
+		if previous is not None:
+			yield previous, True
+		previous = chunk
+	if previous is not None:
+		yield previous, False
+
+def cleanParallel(lines, operations, jobs, wordMode=False, 
+				removerFiles=('', '', '', '', '', ''), profile='', 
+				stemCacheSize=100000, stemCacheFile='', chunkSize=262144, 
+				stats=None, counter=None):
+	"""Run a CleaningPipeline over lines using jobs worker processes.
+
+	Each worker builds its Remover (see loadRemover) and PorterStemmer once,
+	and then cleans chunks of lines. Results come
+	back in input order: cleaned lines, or lists of words in word mode. At
+	most 2 * jobs chunks are in flight, so memory use stays bounded.
+	The counters of the workers are merged into stats, if given. If a
+	WordCounter is given the workers count the words, which are merged
+	into it instead of being returned.
+	"""
+	if profile != '':
+		# refresh a stale profile once, not in every worker
+		loadRemover(removerFiles, profile)
+	if 'html' in operations:
+		# markup may span chunks, so html is stripped here, in order
+		lines = _stripHtml(lines, wordMode, stats)
+		operations = [o for o in operations if o != 'html']
+	pool = multiprocessing.Pool(jobs, _initWorker, 
+				(list(operations), tuple(removerFiles), profile, 
+				stemCacheSize, stemCacheFile, stats is not None, 
+				counter.capacity if counter is not None else None))
+	pending = deque()
+	try:
+		first = True
+		wholeTags = wordMode and 'tags' in operations
+		for chunk, more in _parallelChunks(lines, chunkSize, wholeTags):
+			task = (chunk, wordMode, first, more)
+			pending.append(pool.apply_async(_cleanChunk, (task,)))
+			first = False
+			while len(pending) >= 2 * jobs or (pending and pending[0].ready()):
+				for result in _chunkResults(pending.popleft(), wordMode, 
+										stats, counter):
+					yield result
+		while pending:
+			for result in _chunkResults(pending.popleft(), wordMode, 
+										stats, counter):
+				yield result
+		pool.close()
+	finally:
+		pool.terminate()
+		pool.join()
+
+def _stripHtml(lines, wordMode, stats):
+	"""Strip html from lines for cleanParallel.
+
+	In word mode the lines are stripped as one space joined string, and the
+	chunks of text left are passed on as lines.
+	"""
+	feedLine = HtmlStripper().feedLine
+	if stats is not None:
+		feedLine = stats.wrap('html', feedLine)
+	if wordMode:
+		for chunk in streamWholeWords(feedLine(chunk) 
+									for chunk in chunkLines(lines)):
+			yield chunk
+		return
+	for batch in batchLines(lines):
+		for line in feedLine("\n".join(batch)).split("\n"):
+			yield line
+
+def _chunkResults(asyncResult, wordMode, stats, counter):
+	"""Yield the cleaned lines, or the list of words, of a finished chunk."""
+	result, taken = asyncResult.get()
+	if taken is not None:
+		stats.merge(taken)
+	if counter is not None:
+		counter.merge(result)
+		return
+	if not wordMode:
+		for line in result:
+			yield line
+	elif result:
+		yield result
+
+def cleanFiles(sources, outputDir, operations, outputArgs, jobs=1, shards=0, 
+				removerFiles=('', '', '', '', '', ''), profile='', 
+				stemCacheSize=100000, stemCacheFile='', stats=None, 
+				errors=sys.stderr):
+	"""Clean many documents with a pool of jobs worker processes.
+
+	sources are (path, name) pairs, see batchSources. Each document is
+	cleaned on its own, the way the command line cleans one input, and
+	written to outputDir: to outputDir/name, mirroring the source tree, or
+	with shards to the document number modulo shards'th of the files
+	outputDir/shard-NNNNN.txt. outputDir/index.tsv gets a line for every
+	document written: its path, the output file (relative to outputDir),
+	and the byte offset and length of its output there.
+
+	A document that can not be read or written is reported to errors, and
+	the rest of the batch goes on. So is a document whose output file is
+	the one of a document before it (the same name below two directories,
+	or x.txt and x.txt.gz), which is not cleaned. Returns the number of
+	such documents.
+
+	outputArgs are the parsed command line args (see _outputArgs).
+	"""
+	if profile != '':
+		# refresh a stale profile once, not in every worker
+		loadRemover(removerFiles, profile)
+	_makeDirs(outputDir)
+	initArgs = (list(operations), tuple(removerFiles), profile, stemCacheSize, 
+				stemCacheFile, stats is not None, None, outputArgs)
+	failed = 0
+	if shards:
+		tasks = [(path, name, None) for path, name in sources]
+	else:
+		tasks = []
+		owners = {}
+		for path, name in sources:
+			name = _outputName(name)
+			owner = owners.setdefault(os.path.normcase(name), path)
+			if owner is not path:
+				errors.write("%s: output %s is already the one of %s\n" % 
+							(path, name, owner))
+				failed += 1
+				continue
+			tasks.append((path, name, outputDir))
+	pool = None
+	if jobs > 1:
+		pool = multiprocessing.Pool(jobs, _initWorker, initArgs)
+		results = pool.imap(_cleanFile, tasks, 8)
+	else:
+		_initWorker(*initArgs)
+		results = (_cleanFile(task) for task in tasks)
+	shardFiles = [open(os.path.join(outputDir, 'shard-%05d.txt' % n), 'wb') 
+				for n in range(shards)]
+	index = open(os.path.join(outputDir, 'index.tsv'), 'w')
+	written = 0
+	try:
+		for path, output, error, taken in results:
+			if taken is not None:
+				stats.merge(taken)
+			if error is not None:
+				errors.write("%s: %s\n" % (path, error))
+				failed += 1
+				continue
+			if shards:
+				out = shardFiles[written % shards]
+				offset = out.tell()
+				out.write(output)
+				target = os.path.basename(out.name)
+				length = len(output)
+			else:
+				target, offset, length = output
+			index.write("%s\t%s\t%d\t%d\n" % (path, target, offset, length))
+			written += 1
+		if pool is not None:
+			pool.close()
+	finally:
+		if pool is not None:
+			pool.terminate()
+			pool.join()
+		for out in shardFiles:
+			out.close()
+		index.close()
+	if pool is None and stemCacheFile != '':
+		stemCache = _worker['first']._stemmer.cache
+		if stemCache is not None:
+			stemCache.dump(stemCacheFile)
+	return failed
+
+def batchSources(patterns):
+	"""Return the (path, name) pairs of the documents patterns name.
+
+	A pattern is a file, a directory (whose files are all taken, walking
+	it in sorted order) or a glob ('**' matches directories at any depth on
+	python 3). name is the path of a file below the directory it was found
+	in, or else the path as given, made relative. A path named more than
+	once is taken the first time; a file that does not exist is kept, to
+	be reported when it is cleaned.
+	"""
+	import glob
+	sources = []
+	seen = set()
+	def add(path, root=None):
+		key = os.path.abspath(path)
+		if key in seen:
+			return
+		seen.add(key)
+		name = os.path.relpath(path, root) if root is not None else path
+		sources.append((path, _relativeName(name)))
+	for pattern in patterns:
+		if glob.has_magic(pattern):
+			if sys.version_info >= (3, 5):
+				paths = sorted(glob.glob(pattern, recursive=True))
+			else:
+				paths = sorted(glob.glob(pattern))
+		else:
+			paths = [pattern]
+		for path in paths:
+			if not os.path.isdir(path):
+				add(path)
+				continue
+			for directory, subdirs, files in os.walk(path):
+				subdirs.sort()
+				for filename in sorted(files):
+					add(os.path.join(directory, filename), path)
+	return sources
+
+def _outputName(name):
+	"""Return the name of the output file of a document named name (see
+	batchSources): the output is not compressed, so it loses a compression
+	suffix."""
+	base, suffix = os.path.splitext(name)
+	if suffix in [s for c, m, s in _compressions] and base:
+		return base
+	return name
+
+def _relativeName(path):
+	"""Turn a path into a relative one, without '..' or a drive."""
+	path = os.path.splitdrive(os.path.normpath(path))[1]
+	parts = [p for p in path.replace(os.sep, '/').split('/') 
+			if p not in ('', '.', '..')]
+	return os.path.join(*parts) if parts else '_'
+
+def _makeDirs(directory):
+	"""Make directory and its parents, if they do not exist yet."""
+	try:
+		os.makedirs(directory)
+	except OSError:
+		# it exists, or another worker just made it
+		if not os.path.isdir(directory):
+			raise
+
+def _cleanFile(task):
+	"""Clean one document of cleanFiles in a worker process.
+
+	The name of a task with an output directory is the one of the output
+	file (see _outputName). Returns the path, the output (UTF-8 bytes, or
+	the (name, offset, length) of the file written then) or None,
+	the error message or None, and the stats counters recorded for the
+	document, if any.
+	"""
+	path, name, outputDir = task
+	args = _worker['args']
+	pipeline = _worker['first']
+	output = error = None
+	try:
+		f = openText(path)
+		try:
+			lines = _inputLines(args, f)
+			if args.line_mode:
+				cleaned = pipeline.cleanLines(lines)
+			else:
+				cleaned = pipeline.cleanWords(lines)
+			out = io.StringIO()
+			counter = (WordCounter(args.approximate) if args.count or 
+						args.vocab else None)
+			_writeOutput(args, cleaned, out, counter)
+		finally:
+			f.close()
+		output = out.getvalue().encode('utf-8', 'surrogateescape')
+		if outputDir is not None:
+			target = os.path.join(outputDir, name)
+			_makeDirs(os.path.dirname(target))
+			f = open(target, 'wb')
+			f.write(output)
+			f.close()
+			output = (name, 0, len(output))
+	except (EnvironmentError, ValueError) as e:
+		output, error = None, str(e)
+	stats = _worker['stats']
+	return path, output, error, stats.take() if stats is not None else None
+
+def _outputArgs(args):
+	"""Return the parsed args _inputLines and _writeOutput use, which can
+	be sent to a worker process (unlike the input file)."""
+	return argparse.Namespace(**dict((name, getattr(args, name)) for name in 
+					('lowercase', 'line_mode', 'output_delimiter', 'count', 
+					'vocab', 'top', 'count_format', 'approximate')))
+
+def cleanCheckpointed(inputPath, outputPath, checkpointPath, operations, 
+					outputArgs, incremental=False, every=1 << 24, 
+					removerFiles=('', '', '', '', '', ''), profile='', 
+					stemCacheSize=100000, stemCacheFile='', stats=None, 
+					log=sys.stderr):
+	"""Clean a file into another, recording progress so a run can resume.
+
+	The input is cleaned a block of about every bytes at a time. After each
+	block the output is flushed to disk, and checkpointPath records the
+	input and output byte offsets reached, with the options of the run and
+	the html markup left open. A run with a checkpoint cuts the output back
+	to the recorded offset and goes on from the recorded input offset; a
+	checkpoint made with other options or another input is an error
+	(ValueError).
+
+	Blocks are cut like the chunks of cleanParallel, so the output is the
+	same as cleaning the whole input at once, but for stopword phrases
+	spanning two blocks in word mode, which are not removed (as with
+	--jobs).
+
+	With incremental set the input is a growing file, and the checkpoint is
+	where the last run stopped: only complete lines appended since are
+	cleaned, and their output appended. An input that is shorter than the
+	checkpoint, is another file (inode) or whose first bytes changed was
+	rotated, and is cleaned from the start. Without incremental such an
+	input is an error.
+
+	outputArgs are the parsed command line args (see _outputArgs). Returns
+	the number of input bytes cleaned.
+	"""
+	config = {'input': os.path.abspath(inputPath), 
+			'operations': list(operations), 'files': list(removerFiles), 
+			'lowercase': outputArgs.lowercase, 
+			'line_mode': outputArgs.line_mode, 
+			'output_delimiter': outputArgs.output_delimiter}
+	checkpoint = _loadCheckpoint(checkpointPath)
+	if checkpoint is None:
+		checkpoint = {'format': 1, 'config': config, 'input': 0, 'output': 0, 
+					'html': None, 'open': False}
+	elif checkpoint.get('format') != 1 or checkpoint['config'] != config:
+		raise ValueError("%s was made with other options or input" % 
+						checkpointPath)
+	info = os.stat(inputPath)
+	if checkpoint['input'] > info.st_size:
+		if not incremental:
+			raise ValueError("%s is shorter than at %s" % (inputPath, 
+							checkpointPath))
+		log.write("%s is shorter than at the last run, cleaning it from the "
+				"start\n" % inputPath)
+		checkpoint.update({'input': 0, 'html': None})
+	elif checkpoint['input'] and (
+			checkpoint.get('inode', info.st_ino) != info.st_ino or
+			checkpoint.get('head', '') != 
+			_fileHead(inputPath, checkpoint.get('head_size', 0))):
+		if not incremental:
+			raise ValueError("%s is not the file it was at %s" % (inputPath, 
+							checkpointPath))
+		log.write("%s was replaced since the last run, cleaning it from the "
+				"start\n" % inputPath)
+		checkpoint.update({'input': 0, 'html': None})
+	# what tells this input from the one a log rotation leaves in its place
+	headSize = min(info.st_size, 4096)
+	checkpoint.update({'inode': info.st_ino, 'head_size': headSize, 
+					'head': _fileHead(inputPath, headSize)})
+	if not os.path.exists(outputPath):
+		open(outputPath, 'wb').close()
+	if os.path.getsize(outputPath) < checkpoint['output']:
+		raise ValueError("%s is shorter than at %s" % (outputPath, 
+						checkpointPath))
+
+	wordMode = not outputArgs.line_mode
+	delimiter = _utf8(_outputDelimiter(outputArgs))
+	start = offset = checkpoint['input']
+	stripper = None
+	if 'html' in operations:
+		stripper = HtmlStripper()
+		if checkpoint['html'] is not None:
+			stripper.setState(checkpoint['html'])
+	_initWorker([o for o in operations if o != 'html'], removerFiles, profile, 
+				stemCacheSize, stemCacheFile, stats is not None)
+	inputFile = open(inputPath, 'rb')
+	out = open(outputPath, 'r+b')
+	try:
+		out.truncate(checkpoint['output'])
+		out.seek(checkpoint['output'])
+		inputFile.seek(start)
+		lines = (line.decode('utf-8', 'surrogateescape') 
+				for line in _completeLines(inputFile, incremental))
+		# in word mode html is stripped a block at a time too, so a block
+		# must not end inside markup either
+		wholeTags = wordMode and ('tags' in operations or stripper is not None)
+		for chunk, more in _parallelChunks(lines, every, wholeTags):
+			# articles are only removed from the front of the whole input
+			first = offset == 0
+			offset += sum(len(line.encode('utf-8', 'surrogateescape')) 
+						for line in chunk)
+			chunk = list(_inputLines(outputArgs, chunk))
+			if stripper is not None and wordMode:
+				# stripped as one space joined string, as _stripHtml does;
+				# the space at the end keeps the words of two blocks apart
+				chunk = [stripper.feedLine(" ".join(chunk) + ' ')]
+			elif stripper is not None:
+				chunk = stripper.feedLine("\n".join(chunk)).split("\n")
+			result, taken = _cleanChunk((chunk, wordMode, first, more))
+			if taken is not None:
+				stats.merge(taken)
+			if not wordMode:
+				for line in result:
+					out.write(line.encode('utf-8', 'surrogateescape') + b"\n")
+			elif result:
+				if checkpoint['open']:
+					out.write(delimiter)
+				out.write(delimiter.join(w.encode('utf-8', 'surrogateescape') 
+										for w in result))
+				checkpoint['open'] = True
+			checkpoint.update({'input': offset, 
+							'html': stripper.getState() if stripper else None})
+			_saveCheckpoint(checkpointPath, checkpoint, out)
+		if (wordMode and (checkpoint['open'] or start == 0) or 
+				start == 0 and out.tell() == 0):
+			# the line break ending the output of a run
+			out.write(b"\n")
+			checkpoint['open'] = False
+			_saveCheckpoint(checkpointPath, checkpoint, out)
+	finally:
+		out.close()
+		inputFile.close()
+	if stemCacheFile != '':
+		stemCache = _worker['first']._stemmer.cache
+		if stemCache is not None:
+			stemCache.dump(stemCacheFile)
+	return offset - start
+
+def _fileHead(path, size):
+	"""Return the sha1 (hex) of the first size bytes of a file."""
+	f = open(path, 'rb')
+	try:
+		return hashlib.sha1(f.read(size)).hexdigest()
+	finally:
+		f.close()
+
+def _completeLines(inputFile, incremental):
+	"""Yield the lines of a binary file, without a last line that has no
+	line break yet when incremental is set."""
+	for line in inputFile:
+		if incremental and not line.endswith(b"\n"):
+			return
+		yield line
+
+def _loadCheckpoint(filename):
+	"""Load a checkpoint file, None if there is none."""
+	if not os.path.exists(filename):
+		return None
+	f = open(filename, 'r')
+	try:
+		return json.load(f)
+	finally:
+		f.close()
+
+def _saveCheckpoint(filename, checkpoint, out):
+	"""Flush out to disk, then record checkpoint (with the output offset)
+	in filename, replacing it in one step."""
+	out.flush()
+	os.fsync(out.fileno())
+	checkpoint['output'] = out.tell()
+	tmpname = filename + '.tmp'
+	f = open(tmpname, 'w')
+	json.dump(checkpoint, f, sort_keys=True)
+	f.flush()
+	os.fsync(f.fileno())
+	f.close()
+	getattr(os, 'replace', os.rename)(tmpname, filename)
+
+class CleaningServer:
+	"""Serves cleaning requests over HTTP, on localhost or a Unix socket.
+
+	The word lists, regexes and stem cache are loaded once and kept warm.
+	Connections are multiplexed with asyncio. The cleaning itself runs in a
+	worker thread, or in a pool of worker processes, so the event loop keeps
+	taking requests. Requests that arrive while the workers are busy are
+	batched: those with the same flags are cleaned in one worker call.
+
+	POST /clean?flags=-ntpSes with the text as body answers with what the
+	command line writes for that text and those flags. GET /health answers
+	'ok'. Bad flags answer 400 with the error, and so do flags naming a
+	word list file the server was not started with: clients can not make
+	it read any other file. A Remover is kept for each set of files, made
+	again when one of them changes; the maxRemovers used last are kept.
+
+	public interface:
+	* __init__ -- takes the address (PORT, HOST:PORT or unix:PATH), the
+		number of worker processes, the stem cache options of the command
+		line, and the word list files requests may name. With one worker
+		the stem cache file is written when done.
+	* serve -- serve until interrupted. Needs python 3.7 or later.
+	"""
+
+	maxRequestSize = 1 << 26
+	maxRemovers = 16
+
+	def __init__(self, address, jobs=1, stemCacheSize=100000, 
+				stemCacheFile='', files=()):
+		"""Get a new CleaningServer instance."""
+		self.address = address
+		self.jobs = max(jobs, 1)
+		self._options = (stemCacheSize, stemCacheFile, 
+						tuple(f for f in files if f != ''), self.maxRemovers)
+		self._pending = []
+		self._running = 0
+		self._loop = None
+		self._executor = None
+
+	def serve(self):
+		"""Serve requests until interrupted."""
+		import asyncio
+		from concurrent import futures
+		if self.jobs > 1:
+			self._executor = futures.ProcessPoolExecutor(self.jobs, 
+								initializer=_initServer, initargs=self._options)
+		else:
+			_initServer(*self._options)
+			self._executor = futures.ThreadPoolExecutor(1)
+		self._loop = asyncio.new_event_loop()
+		asyncio.set_event_loop(self._loop)
+		factory = lambda: _HttpConnection(self)
+		path = None
+		if self.address.startswith('unix:'):
+			path = self.address[len('unix:'):]
+			if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode):
+				os.unlink(path)
+			listening = self._loop.create_unix_server(factory, path)
+		else:
+			host, sep, port = self.address.rpartition(':')
+			listening = self._loop.create_server(factory, host or '127.0.0.1', 
+												int(port))
+		server = self._loop.run_until_complete(listening)
+		self._loop.add_signal_handler(signal.SIGTERM, self._loop.stop)
+		try:
+			self._loop.run_forever()
+		except KeyboardInterrupt:
+			pass
+		finally:
+			server.close()
+			self._loop.run_until_complete(server.wait_closed())
+			self._executor.shutdown()
+			self._loop.close()
+			stemCache = _server.get('stemmer') and _server['stemmer'].cache
+			if stemCache is not None and self._options[1] != '':
+				stemCache.dump(self._options[1])
+			if path is not None and os.path.exists(path):
+				os.unlink(path)
+
+	def handle(self, method, path, query, body, respond):
+		"""Answer a request by calling respond(status, text)."""
+		if path == '/health':
+			respond(200, "ok\n")
+		elif path != '/clean':
+			respond(404, "not found\n")
+		elif method != 'POST':
+			respond(405, "POST the text to clean\n")
+		else:
+			from urllib.parse import parse_qs
+			flags = parse_qs(query).get('flags', [''])[0]
+			text = body.decode('utf-8', 'surrogateescape')
+			self._pending.append((flags, text, respond))
+			self._dispatch()
+
+	# private interface
+	def _dispatch(self):
+		"""Hand the pending requests to the free workers, grouped by flags."""
+		if self._running >= self.jobs or not self._pending:
+			return
+		groups = OrderedDict()
+		for flags, text, respond in self._pending:
+			groups.setdefault(flags, []).append((text, respond))
+		self._pending = []
+		for flags, requests in groups.items():
+			self._running += 1
+			job = self._loop.run_in_executor(self._executor, _serveBatch, 
+								flags, [text for text, respond in requests])
+			job.add_done_callback(lambda job, requests=requests: 
+								self._done(job, requests))
+
+	def _done(self, job, requests):
+		"""Answer the requests of a finished worker call."""
+		self._running -= 1
+		try:
+			results = job.result()
+		except Exception as e:
+			results = [(500, "%s\n" % e)] * len(requests)
+		for (text, respond), (status, output) in zip(requests, results):
+			respond(status, output)
+		self._dispatch()
+
+class _HttpConnection:
+	"""An asyncio protocol reading HTTP/1.x requests for a CleaningServer.
+
+	Requests on a connection are answered in order, one at a time.
+	"""
+
+	_reasons = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 
+				405: 'Method Not Allowed', 413: 'Payload Too Large', 
+				500: 'Internal Server Error'}
+
+	def __init__(self, server):
+		"""Get a new connection for server."""
+		self._server = server
+		self._transport = None
+		self._buffer = bytearray()
+		self._busy = False
+		self._eof = False
+		self._keepAlive = False
+
+	def connection_made(self, transport):
+		self._transport = transport
+
+	def connection_lost(self, exc):
+		self._transport = None
+
+	def data_received(self, data):
+		self._buffer.extend(data)
+		self._next()
+
+	def eof_received(self):
+		self._eof = True
+		self._next()
+		# keep the transport open for the answer still being cleaned
+		return True
+
+	def pause_writing(self):
+		# the client reads slowly, stop reading its requests meanwhile
+		self._transport.pause_reading()
+
+	def resume_writing(self):
+		self._transport.resume_reading()
+
+	# private interface
+	def _next(self):
+		"""Start on the next complete request, if not busy with one."""
+		if self._busy or self._transport is None:
+			return
+		try:
+			request = self._parse()
+		except ValueError as e:
+			self._keepAlive = False
+			self._busy = True
+			self._respond(e.args[1] if len(e.args) > 1 else 400, 
+						"%s\n" % e.args[0])
+			return
+		if request is None:
+			if self._eof:
+				self._transport.close()
+			return
+		method, path, query, body, self._keepAlive = request
+		self._busy = True
+		self._server.handle(method, path, query, body, self._respond)
+
+	def _parse(self):
+		"""Take a complete request off the buffer, None if there is none."""
+		end = self._buffer.find(b"\r\n\r\n")
+		if end == -1:
+			if len(self._buffer) > 65536:
+				raise ValueError("request head too large", 413)
+			return None
+		head = bytes(self._buffer[:end]).decode('latin-1').split("\r\n")
+		try:
+			method, target, version = head[0].split(' ')
+		except ValueError:
+			raise ValueError("bad request line")
+		headers = {}
+		for line in head[1:]:
+			name, sep, value = line.partition(':')
+			headers[name.strip().lower()] = value.strip()
+		try:
+			length = int(headers.get('content-length', '0'))
+		except ValueError:
+			raise ValueError("bad content-length")
+		if length > self._server.maxRequestSize:
+			raise ValueError("request too large", 413)
+		if len(self._buffer) < end + 4 + length:
+			return None
+		body = bytes(self._buffer[end + 4:end + 4 + length])
+		del self._buffer[:end + 4 + length]
+		connection = headers.get('connection', '').lower()
+		keepAlive = (connection != 'close' if version == 'HTTP/1.1' else 
+					connection == 'keep-alive')
+		path, sep, query = target.partition('?')
+		return method, path, query, body, keepAlive
+
+	def _respond(self, status, text):
+		"""Send an answer, then go on with the next request."""
+		if self._transport is None:
+			return
+		body = text.encode('utf-8', 'surrogateescape')
+		head = ("HTTP/1.1 %d %s\r\nContent-Type: text/plain; charset=utf-8\r\n"
+				"Content-Length: %d\r\n%s\r\n" % (status, 
+				self._reasons.get(status, ''), len(body), 
+				'' if self._keepAlive else "Connection: close\r\n"))
+		self._transport.write(head.encode('latin-1') + body)
+		self._busy = False
+		if not self._keepAlive:
+			self._transport.close()
+			return
+		self._next()
+
+# state of a CleaningServer worker, built once by _initServer
+_server = {}
+
+def _initServer(stemCacheSize, stemCacheFile, files=(), maxRemovers=16):
+	"""Load the stem cache of a CleaningServer worker, and note the word
+	list files requests may name."""
+	stemCache = StemCache(stemCacheSize) if stemCacheSize > 0 else False
+	if (stemCache is not False and stemCacheFile != '' and 
+			os.path.exists(stemCacheFile)):
+		stemCache.load(stemCacheFile)
+	_server['stemmer'] = PorterStemmer(stemCache)
+	_server['files'] = set(os.path.realpath(f) for f in files)
+	_server['removers'] = OrderedDict()
+	_server['maxRemovers'] = maxRemovers
+	_server['parser'] = _argumentParser(serving=True)
+
+def _serveBatch(flags, texts):
+	"""Clean the texts of requests that have the same flags.
+
+	Returns a (status, output) pair for each text.
+	"""
+	try:
+		args = _server['parser'].parse_args(shlex.split(flags))
+	except ValueError as e:
+		return [(400, "%s\n" % e)] * len(texts)
+	operations, removerFiles = _operations(args)
+	for filename in removerFiles[:6]:
+		if (filename != '' and 
+				os.path.realpath(filename) not in _server['files']):
+			return [(400, "%s is not a word list file of the server\n" % 
+					filename)] * len(texts)
+	try:
+		remover = _serverRemover(removerFiles)
+	except (EnvironmentError, ValueError) as e:
+		return [(400, "%s\n" % e)] * len(texts)
+	results = []
+	for text in texts:
+		pipeline = CleaningPipeline(operations, remover, _server['stemmer'])
+		lines = _inputLines(args, io.StringIO(text, newline=None))
+		if args.line_mode:
+			output = pipeline.cleanLines(lines)
+		else:
+			output = pipeline.cleanWords(lines)
+		out = io.StringIO()
+		counter = (WordCounter(args.approximate) if args.count or args.vocab 
+					else None)
+		_writeOutput(args, output, out, counter)
+		results.append((200, out.getvalue()))
+	return results
+
+def _serverRemover(removerFiles):
+	"""Return the Remover of a CleaningServer worker for removerFiles, made
+	again when the mtime or size of one of the files changed. Only the
+	maxRemovers used last are kept."""
+	stamps = []
+	for filename in removerFiles[:6]:
+		if filename != '':
+			info = os.stat(filename)
+			stamps.append((info.st_mtime, info.st_size))
+	removers = _server['removers']
+	entry = removers.pop(removerFiles, None)
+	if entry is None or entry[0] != stamps:
+		entry = (stamps, Remover(*removerFiles))
+	removers[removerFiles] = entry
+	while len(removers) > _server['maxRemovers']:
+		removers.popitem(last=False)
+	return entry[1]
+
+def _operations(args):
+	"""Return the operations and Remover arguments (the files, then the
+	tokenizer) of parsed command line args.
+
+	A word list file turns its operation on.
+	"""
+	if args.stopword_file != '':
+		args.stopwords = True
 	if args.dict_file != '':
 		args.words = True
 	if args.punct_file != '':
@@ -708,84 +4152,561 @@ if __name__ == "__main__":
 		args.apostrophes = True
 	if args.article_file != '':
 		args.articles = True
-		
-	contentList = (line.strip().lower() if args.lowercase else line.strip() 
-					for line in args.input_file)
+	if args.phrase_file != '':
+		args.stopwords = True
+	operations = [o for o in CleaningPipeline.OPERATIONS if getattr(args, o)]
+	removerFiles = (args.stopword_file, args.punct_file, args.dict_file, 
+					args.apost_file, args.article_file, args.phrase_file, 
+					args.tokenizer)
+	return operations, removerFiles
 
-	output = []
+def _inputLines(args, lines):
+	"""Strip (and lowercase, with -l) input lines."""
+	return (line.strip().lower() if args.lowercase else line.strip() 
+			for line in lines)
 
-	delimiters = {'space':' ', 'newline': "\n", 'tab': "\t"}
-	outputDelimiter = args.output_delimiter if args.output_delimiter not in delimiters else delimiters[args.output_delimiter]
+def _writeOutput(args, output, out, counter=None):
+	"""Write the output of a pipeline the way the command line does.
 
-	cleaner = Remover(args.stopword_file, args.dict_file, 
-					args.punct_file, args.apost_file, args.article_file)
-	stemmer = PorterStemmer()
+	output is cleaned lines in line mode, lists of words otherwise. With a
+	WordCounter the words are counted and the counts written instead.
+	"""
+	if counter is not None:
+		for words in output:
+			counter.add(words if not args.line_mode else words.split())
+		counter.write(out, args.top, args.count_format == 'json', 
+					not args.vocab)
 
-	if args.line_mode:
-		output = contentList
-		if args.articles:
-			output = cleaner.removeArticlesFromFrontLine(output)
+	elif args.line_mode:
+		written = False
+		for line in output:
+			out.write(line + "\n")
+			written = True
+		if not written:
+			out.write("\n")
 
-		if args.numbers:
-			output = cleaner.removeNumbersLine(output)
+	else: # word mode
+		outputDelimiter = _outputDelimiter(args)
+		first = True
+		for words in output:
+			if not first:
+				out.write(outputDelimiter)
+			out.write(outputDelimiter.join(words))
+			first = False
+		out.write("\n")
 
-		if args.apostrophes:
-			output = cleaner.removeApostrophesLine(output)
+def _outputDelimiter(args):
+	"""Return the word mode output delimiter of the command line args."""
+	delimiters = {'space':' ', 'newline': "\n", 'tab': "\t"}
+	return delimiters.get(args.output_delimiter, args.output_delimiter)
+
+def _writeStats(args, stats):
+	"""Write the stats summary to stderr (--stats) and/or a file as JSON
+	(--stats-file)."""
+	if args.stats:
+		stats.write(sys.stderr)
+	if args.stats_file != '':
+		statsFile = open(args.stats_file, 'w')
+		stats.write(statsFile, asJson=True)
+		statsFile.close()
 
-		if args.tags:
-			output = cleaner.removeTagsLine(output)
+class _RequestParser(argparse.ArgumentParser):
+	"""Parses the flags of a --serve request, raising ValueError on errors."""
 
-		if args.punctuation:
-			output = cleaner.removePunctuationLine(output)
+	def error(self, message):
+		"""Raise ValueError instead of exiting."""
+		raise ValueError(message)
 
-		if args.stopwords:
-			output = cleaner.removeStopwordsLine(output)
+def _inputFile(path):
+	"""Open the -i file for argparse, see openText ('-' is stdin)."""
+	if path == '-':
+		return sys.stdin
+	try:
+		return openText(path)
+	except (EnvironmentError, ValueError) as e:
+		raise argparse.ArgumentTypeError("can't open '%s': %s" % (path, e))
 
-		if args.words:
-			output = cleaner.removeNonDictionaryWordsLine(output)
+def _argumentParser(serving=False):
+	"""Return the command line parser.
 
-		if args.spaces:
-			output = cleaner.removeExtraSpacesLine(output)
+	The parser for --serve requests leaves out the options of the process
+	(input file, jobs, profile, stem cache, stats and --serve itself), and
+	raises ValueError instead of exiting.
+	"""
+	parserClass = _RequestParser if serving else argparse.ArgumentParser
+	parser = parserClass(
+				prog='./text_cleaner.py', 
+				add_help=not serving, 
+				description="""Cleans* text. \n*cleaning means 
+							lowercasing, removing things from strings, 
+							and stemming.""")
+	parser.add_argument('--stopword-file', 
+				dest='stopword_file', 
+				default='', 
+				help="""use the specified file for stopwords. If specified, 
+						stopwords will be removed and replaced with nothing.""", 
+				metavar="FILE")
+	parser.add_argument('--dict-file', 
+				dest='dict_file', 
+				default='', 
+				help="""use the specified file for dictionary words. If this 
+						options is specified only words found in the dictionary 
+						will be used.""", 
+				metavar="FILE")
+	parser.add_argument('--punct-file', 
+				dest='punct_file', 
+				default='', 
+				help="""use the specified file for punctuation. If specified,
+						punctuation is removed and replaced with a space.""", 
+				metavar="FILE")
+	parser.add_argument('--apost-file', 
+				dest='apost_file', 
+				default='', 
+				help="""use the specified file for apostrophes. If specified, 
+						apostrophes are remove and replaced with nothing.""", 
+				metavar="FILE")
+	parser.add_argument('--art-file', 
+				dest='article_file', 
+				default='', 
+				help="""use the specified file for articles. If specified, the
+						articles will be removed from the front of strings and
+						replaced with nothing.""", 
+				metavar="FILE")
+	parser.add_argument('--phrase-file', 
+				dest='phrase_file', 
+				default='', 
+				help="""use the specified file for stopword phrases, one per 
+						line. If specified, stopwords are removed and so are 
+						the phrases, matched as whole words and longest 
+						first.""", 
+				metavar="FILE")
+	parser.add_argument('--tokenizer', 
+				dest='tokenizer', 
+				default='whitespace', 
+				help="""how the stopword, dictionary and stemming operations 
+						(and word mode output) split text into words: 
+						'whitespace' splits on runs of any white space (the 
+						default), 'space' on every single space (empty words 
+						keep runs of spaces), 'words' keeps only runs of word 
+						characters of any script, with apostrophes inside 
+						words; anything else is a regex matching one 
+						word.""", 
+				metavar="KIND")
+	if not serving:
+		parser.add_argument('--profile', 
+					dest='profile', 
+					default='', 
+					help="""keep the word lists and patterns loaded from the files 
+							above in the specified binary file, so later runs 
+							load them quickly. The file is rebuilt when one of 
+							the files above changes.""", 
+					metavar="FILE")
+		parser.add_argument('--make-word-list', 
+					dest='make_word_list', 
+					nargs=2, 
+					default=None, 
+					help="""write the words of SOURCE (one per line) to TARGET 
+							as a compact word list file, and exit. TARGET can 
+							be given as --stopword-file or --dict-file: it is 
+							memory mapped, so it loads at once and processes 
+							share one copy of it.""", 
+					metavar=("SOURCE", "TARGET"))
+		parser.add_argument('--bloom-rate', 
+					dest='bloom_rate', 
+					type=float, 
+					default=0, 
+					help="""with --make-word-list, add a Bloom filter with the 
+							false positive RATE (e.g. 0.01) in front of the 
+							word list. Words not in the list then rarely touch 
+							the list itself; lookups stay exact.""", 
+					metavar="RATE")
+	parser.add_argument('-d', 
+				'--output-delimiter', 
+				dest='output_delimiter', 
+				help="""Specifies output delimiter. Default is a space between 
+						words.""", 
+				default='space',
+				metavar="[space|newline|tab|(characters)]")
+	parser.add_argument('-L', 
+				'--line-mode', 
+				action='store_true', 
+				default=False, 
+				dest='line_mode', 
+				help="""Output the words in line mode. Lines are preserved. 
+						Using this option nullifies the output delimiter options 
+						specified.""")
 
-		if args.stem:
-			output = stemmer.stemWordsLine(output)
+	parser.add_argument('-H', '--strip-html', 
+				dest='html', 
+				action='store_true', 
+				default=False, 
+				help="""Strip html markup before anything else. Tags may span 
+						lines, script and style content and comments are 
+						dropped, and entities are decoded.""")
+	parser.add_argument('-A', '--remove-articles', 
+				dest='articles', 
+				action='store_true', 
+				default=False, 
+				help="""Remove articles from the beginning of lines.""")
+	parser.add_argument('-n', '--remove-numbers', 
+				dest='numbers', 
+				action='store_true', 
+				default=False, 
+				help="""Remove numbers.""")
+	parser.add_argument('-a', '--remove-apostrophes', 
+				dest='apostrophes', 
+				action='store_true', 
+				default=False, 
+				help="""Remove apostrophes and replaced with nothing.""")
+	parser.add_argument('-t', '--remove-tags', 
+				dest='tags', 
+				action='store_true', 
+				default=False, 
+				help="""Remove html/xml tags.""")
+	parser.add_argument('-p', '--remove-punctuation', 
+				dest='punctuation', 
+				action='store_true', 
+				default=False, 
+				help="""Remove punctuation replacing with a space.""")
+	parser.add_argument('-S', '--remove-stopwords', 
+				dest='stopwords', 
+				action='store_true', 
+				default=False, 
+				help="""Remove stopwords.""")
+	parser.add_argument('-w', '--remove-words', 
+				dest='words', 
+				action='store_true', 
+				default=False, 
+				help="""Remove non-dictionary words.""")
+	parser.add_argument('-e', '--remove-spaces',
+				dest='spaces', 
+				action='store_true', 
+				default=False, 
+				help="""Remove extra spaces.""")
 
-		sys.stdout.write("\n".join(output) + "\n")
+	parser.add_argument('-l', 
+				'--lowercase', 
+				action='store_true', 
+				default=False, 
+				dest='lowercase', 
+				help='lowercase words.')
+	parser.add_argument('-s', 
+				'--stem-words', 
+				action='store_true', 
+				default=False, 
+				dest='stem', 
+				help='stem the words (using a porter stemmer).')
+	if not serving:
+		parser.add_argument('--stem-cache', 
+					dest='stem_cache', 
+					default='', 
+					help="""use the specified file to keep stems between runs. The 
+							file is loaded (if it exists) before stemming and 
+							written when done.""", 
+					metavar="FILE")
+		parser.add_argument('--stem-cache-size', 
+					dest='stem_cache_size', 
+					type=int, 
+					default=None, 
+					help="""number of stemmed words to keep in memory. Default is 
+							100000, 0 turns the cache off. When the compiled 
+							speedups are built the default is 0, unless 
+							--stem-cache is given: they stem faster than the 
+							cache looks words up.""", 
+					metavar="N")
+		parser.add_argument('-j', 
+					'--jobs', 
+					dest='jobs', 
+					type=int, 
+					default=1, 
+					help="""number of processes to clean with. Default is 1. With 
+							more than one process a --stem-cache file is only 
+							read, not written.""", 
+					metavar="N")
+	parser.add_argument('--count', 
+				dest='count', 
+				action='store_true', 
+				default=False, 
+				help="""instead of the cleaned text, write each word and the 
+						number of times it occurs, most frequent first.""")
+	parser.add_argument('--vocab', 
+				dest='vocab', 
+				action='store_true', 
+				default=False, 
+				help="""same as --count, but write only the words.""")
+	parser.add_argument('--top', 
+				dest='top', 
+				type=int, 
+				default=0, 
+				help="""with --count or --vocab, write only the N most frequent 
+						words.""", 
+				metavar="N")
+	parser.add_argument('--count-format', 
+				dest='count_format', 
+				choices=('tsv', 'json'), 
+				default='tsv', 
+				help="""with --count or --vocab, write tab separated lines 
+						(word, count and, with --approximate, the possible 
+						overcount) or a JSON document. Default is tsv.""")
+	parser.add_argument('--approximate', 
+				dest='approximate', 
+				type=int, 
+				default=0, 
+				help="""with --count or --vocab, count approximately keeping 
+						at most 2N words in memory. The N most frequent words 
+						are found, their counts may be too high by the 
+						reported error.""", 
+				metavar="N")
+	if not serving:
+		parser.add_argument('--stats', 
+					dest='stats', 
+					action='store_true', 
+					default=False, 
+					help="""write the time, characters and tokens in and out of 
+							each stage, the stopword and dictionary hit rates 
+							and the stem cache hits to stderr. Stages run on 
+							UTF-8 bytes have rows of their own, counting 
+							bytes.""")
+		parser.add_argument('--stats-file', 
+					dest='stats_file', 
+					default='', 
+					help="""write the --stats summary as JSON to the specified 
+							file.""", 
+					metavar="FILE")
+		parser.add_argument('--serve', 
+					dest='serve', 
+					default='', 
+					help="""instead of cleaning the input, serve cleaning 
+							requests over HTTP, keeping the word lists and 
+							stems loaded. ADDRESS is PORT or HOST:PORT (the 
+							host defaults to 127.0.0.1), or unix:PATH for a 
+							Unix socket. POST the text to /clean?flags=... 
+							with the cleaning flags of the command line; the 
+							response is what the command line would write. 
+							Requests may only name the word list files given 
+							with --serve. --jobs sets the number of worker 
+							processes. Needs python 3.""", 
+					metavar="ADDRESS")
+		parser.add_argument("-i", 
+					"--input-file", 
+					dest="input_file", 
+					nargs='?', 
+					type=_inputFile, 
+					default=sys.stdin, 
+					help="""input file, which may be compressed (gzip, bz2, 
+							xz, or zstd with the zstandard package)""", 
+					metavar="FILE")
+		parser.add_argument('-o', 
+					'--output-file', 
+					dest='output_file', 
+					default='', 
+					help="""output file, default is stdout. It is compressed 
+							when its name ends in .gz, .bz2, .xz or .zst""", 
+					metavar="FILE")
+		parser.add_argument('--dedupe', 
+					dest='dedupe', 
+					action='store_true', 
+					help="""with -L, drop the lines whose cleaned text was 
+							already output (empty lines are kept). A raw 
+							line seen before is dropped without cleaning it 
+							again""")
+		parser.add_argument('--dedupe-memory', 
+					dest='dedupe_memory', 
+					type=int, 
+					default=64, 
+					help="""with --dedupe, the MB of memory the line hashes 
+							can take, after which new lines are no longer 
+							remembered (default 64)""", 
+					metavar="MB")
+		parser.add_argument('--near-duplicates', 
+					dest='near_duplicates', 
+					type=int, 
+					default=0, 
+					help="""with --dedupe, also drop lines whose SimHash 
+							fingerprint (of their character 4-grams) differs 
+							in at most BITS of 64 bits from the one of a line 
+							output (3 is a good start)""", 
+					metavar="BITS")
+		parser.add_argument('--checkpoint', 
+					dest='checkpoint', 
+					default='', 
+					help="""record in FILE how far the input file has been 
+							cleaned into the output file (-i and -o are 
+							needed), every --checkpoint-every MB of input. A 
+							run with the same options and FILE goes on from 
+							there, so an interrupted run can be resumed.""", 
+					metavar="FILE")
+		parser.add_argument('--checkpoint-every', 
+					dest='checkpoint_every', 
+					type=int, 
+					default=16, 
+					help="""with --checkpoint, the MB of input cleaned between 
+							checkpoints. Default is 16.""", 
+					metavar="MB")
+		parser.add_argument('--incremental', 
+					dest='incremental', 
+					action='store_true', 
+					default=False, 
+					help="""with --checkpoint, treat the input as a growing 
+							file (a log): clean only the lines appended to it 
+							since the last run and append their output. A last 
+							line without a line break is left for the next 
+							run.""")
+		parser.add_argument('--batch', 
+					dest='batch', 
+					nargs='+', 
+					default=None, 
+					help="""instead of the input file, clean each of the 
+							documents PATH names (files, directories or 
+							globs, quoted so the shell leaves them alone) on 
+							its own, with --jobs processes, into 
+							--output-dir. A document that fails is reported 
+							on stderr and the others are still cleaned; the 
+							exit status is then 1.""", 
+					metavar="PATH")
+		parser.add_argument('--output-dir', 
+					dest='output_dir', 
+					default='', 
+					help="""with --batch, the directory to write to: the 
+							cleaned documents in the same tree as the sources 
+							(or in --shards files), and index.tsv with a 
+							line for each document: its path, output file, 
+							and the byte offset and length of its output 
+							there.""", 
+					metavar="DIR")
+		parser.add_argument('--shards', 
+					dest='shards', 
+					type=int, 
+					default=0, 
+					help="""with --batch, write the documents one after 
+							another to N files shard-00000.txt ... instead of 
+							one file each.""", 
+					metavar="N")
+	return parser
 
-	else: # word mode
-		output = " ".join(contentList)
-		if args.articles:
-			output = cleaner.removeArticlesFromFront(output)
+if __name__ == "__main__":
+	parser = _argumentParser()
+	args = parser.parse_args()
+	if args.stem_cache_size is None:
+		args.stem_cache_size = (0 if _speedups is not None and 
+								args.stem_cache == '' else 100000)
 
-		if args.numbers:
-			output = cleaner.removeNumbers(output)
+	if args.make_word_list is not None:
+		source, target = args.make_word_list
+		WordList.build(_loadWords(source), target, args.bloom_rate)
+		sys.exit(0)
 
-		if args.apostrophes:
-			output = cleaner.removeApostrophes(output)
+	if args.serve != '':
+		if sys.version_info < (3, 7):
+			parser.error("--serve needs python 3.7 or later")
+		CleaningServer(args.serve, args.jobs, args.stem_cache_size, 
+					args.stem_cache, (args.stopword_file, args.punct_file, 
+					args.dict_file, args.apost_file, args.article_file, 
+					args.phrase_file)).serve()
+		sys.exit(0)
 
-		if args.tags:
-			output = cleaner.removeTags(output)
+	operations, removerFiles = _operations(args)
+	try:
+		Tokenizer(args.tokenizer)
+	except ValueError as e:
+		parser.error(str(e))
+	stats = CleaningStats() if args.stats or args.stats_file != '' else None
 
-		if args.punctuation:
-			output = cleaner.removePunctuation(output)
+	deduper = None
+	if args.dedupe:
+		if not args.line_mode:
+			parser.error("--dedupe needs --line-mode")
+		if args.batch is not None or args.checkpoint != '':
+			parser.error("--dedupe can not be used with --batch or --checkpoint")
+		try:
+			deduper = LineDeduper(args.dedupe_memory << 20, 
+								args.near_duplicates, 'html' not in operations)
+		except ValueError as e:
+			parser.error(str(e))
+		if stats is not None:
+			stats.watchDeduper(deduper)
 
-		if args.stopwords:
-			output = cleaner.removeStopwords(output)
+	if args.batch is not None:
+		if args.output_dir == '':
+			parser.error("--batch needs --output-dir")
+		failed = cleanFiles(batchSources(args.batch), args.output_dir, 
+					operations, _outputArgs(args), args.jobs, args.shards, 
+					removerFiles, args.profile, args.stem_cache_size, 
+					args.stem_cache, stats)
+		_writeStats(args, stats)
+		sys.exit(1 if failed else 0)
 
-		if args.words:
-			output = cleaner.removeNonDictionaryWords(output)
+	if args.checkpoint != '':
+		if args.input_file is sys.stdin or args.output_file == '':
+			parser.error("--checkpoint needs -i and -o")
+		if args.count or args.vocab:
+			parser.error("--checkpoint can not be used with --count or --vocab")
+		args.input_file.close()
+		if (compressionOf(args.input_file.name) is not None or 
+				compressionOf(args.output_file, 'w') is not None):
+			parser.error("--checkpoint needs uncompressed -i and -o files")
+		try:
+			cleanCheckpointed(args.input_file.name, args.output_file, 
+						args.checkpoint, operations, _outputArgs(args), 
+						args.incremental, args.checkpoint_every << 20, 
+						removerFiles, args.profile, args.stem_cache_size, 
+						args.stem_cache, stats)
+		except ValueError as e:
+			parser.error(str(e))
+		_writeStats(args, stats)
+		sys.exit(0)
 
-		if args.spaces:
-			output = cleaner.removeExtraSpaces(output)
+	contentList = _inputLines(args, args.input_file)
+	stemCache = False
+	counter = WordCounter(args.approximate) if args.count or args.vocab else None
 
-		if args.stem:
-			output = stemmer.stemWords(output)
+	output = None
+	if args.jobs > 1:
+		def clean(lines):
+			# with --dedupe, words are counted once duplicates are dropped
+			return cleanParallel(lines, operations, args.jobs, 
+					not args.line_mode, removerFiles, args.profile, 
+					args.stem_cache_size, args.stem_cache, stats=stats, 
+					counter=counter if deduper is None else None)
+	else:
+		cleaner = loadRemover(removerFiles, args.profile)
+		if args.stem_cache_size > 0:
+			stemCache = StemCache(args.stem_cache_size)
+			if args.stem_cache != '' and os.path.exists(args.stem_cache):
+				stemCache.load(args.stem_cache)
+		stemmer = PorterStemmer(stemCache, cleaner.tokenizer)
+		pipeline = CleaningPipeline(operations, cleaner, stemmer, stats)
+		# a regular UTF-8 file is read through mmap, a block of lines at a
+		# time; not stdin, which does not read a lone carriage return as a
+		# line break
+		blocks = None
+		if (args.line_mode and deduper is None and pipeline.takesBytes() and 
+				args.input_file is not sys.stdin):
+			blocks = mappedBlocks(args.input_file, args.lowercase)
+		if blocks is not None:
+			output = pipeline.cleanBlocks(blocks)
+		clean = pipeline.cleanLines if args.line_mode else pipeline.cleanWords
+	if output is None and deduper is not None:
+		output = deduper.dedupe(contentList, clean)
+	elif output is None:
+		output = clean(contentList)
 
-		rtnOutput = []
-		for word in output.split(" "):
-			if word.strip() != '':
-				rtnOutput.append(word.strip())
+	if args.output_file != '':
+		try:
+			out = openText(args.output_file, 'w')
+		except ValueError as e:
+			parser.error(str(e))
+	else:
+		out = sys.stdout
+	try:
+		_writeOutput(args, output, out, counter)
+	except CorruptInputError as e:
+		parser.exit(1, "%s: error: %s\n" % (parser.prog, e))
+	finally:
+		if out is not sys.stdout:
+			out.close()
 
-		output = " ".join(rtnOutput)
-		sys.stdout.write(outputDelimiter.join(output.split(" "))+"\n")
+	if stemCache and args.stem_cache != '':
+		stemCache.dump(args.stem_cache)
 
+	_writeStats(args, stats)